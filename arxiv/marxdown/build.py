@@ -1,21 +1,26 @@
 """
 Builds the site from markdown source.
 """
+import html
 import os
 import shutil
-import sys
-from typing import Optional
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, \
+    ThreadPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Optional, Tuple, List, Iterable, Callable, Deque
 
-import bleach
 import click
 
-from arxiv.base.globals import get_application_config as config
-
 from .services import index, site, source
 from . import render
 from .domain import SourcePage, IndexablePage
 from .factory import create_web_app
 
+COPY_WORKERS = 16
+"""Number of threads used to copy static files and templates."""
+
 
 def generate_template(source_page: SourcePage, rendered_content: str) -> str:
     if source_page.template:
@@ -38,59 +43,187 @@ def generate_template(source_page: SourcePage, rendered_content: str) -> str:
     ])
 
 
-def _build_site(with_search: bool = True) -> None:
-    """Index the entire site."""
-    to_index = []
-    for source_page in source.load_pages():
-        dereferencer = render.get_deferencer(source_page, site.get_site_name())
-        rendered_content = render.render(source_page.content, dereferencer)
-        template_content = generate_template(source_page, rendered_content)
-        indexable_content = bleach.clean(rendered_content, strip=True, tags=[])
-        to_index.append(IndexablePage(source_page, indexable_content))
-        site.store_page_content(source_page.page_path, template_content)
-        site.store_metadata(source_page.page_path, source_page.metadata)
-
-    if with_search:
-        index.create_index()
-        click.echo('Created index')
-        index.add_documents(to_index)
-        click.echo('Added pages')
+def _render_one(source_page: SourcePage, site_name: str) \
+        -> Tuple[str, str, dict, IndexablePage]:
+    """
+    Render a single source page.
+
+    This is a module-level function so that it can be pickled and run in a
+    worker process. It must not depend on the application context;
+    everything that it needs from the config is passed in explicitly.
+    """
+    dereferencer = render.get_deferencer(source_page, site_name)
+    rendered_content, text = render.render_with_text(source_page.content,
+                                                     dereferencer)
+    template_content = generate_template(source_page, rendered_content)
+    # Search highlights are displayed as HTML.
+    indexable_content = html.escape(text, quote=False)
+    return (source_page.page_path, template_content, source_page.metadata,
+            IndexablePage(source_page, indexable_content))
+
+
+def _build_site(with_search: bool = True, parallel: bool = False) -> None:
+    """
+    Index the entire site.
+
+    Parameters
+    ----------
+    with_search : bool
+        If True, build the search index for pages and static files.
+    parallel : bool
+        If True, pages are rendered in a pool of worker processes. Rendering
+        is pure Python (so GIL-bound), which is why we use processes rather
+        than threads. For small sites the pool startup costs more than it
+        saves, so this is off by default.
+
+    """
+    # Source pages that haven't changed since the last build don't need to
+    # be parsed again.
+    source.load_cache(site.get_source_cache_path())
+
+    render_one = partial(_render_one, site_name=site.get_site_name())
+    if parallel:
+        workers = os.cpu_count() or 1   # None if it can't be determined.
+        executor = ProcessPoolExecutor(max_workers=workers)
+        # The pool forks its workers when the first pages are submitted, so
+        # there mustn't be any loader threads running by then.
+        rendered = _map_in_pool(executor, render_one,
+                                source.load_pages(threaded=False),
+                                max_pending=2 * workers)
+    else:
+        executor = None
+        rendered = map(render_one, source.load_pages())
+
+    # Pages are indexed as they are stored, rather than holding on to all of
+    # them until the end.
+    try:
+        if with_search:
+            index.create_index()
+            click.echo('Created index')
+            index.add_documents(_store_pages(rendered))
+            click.echo('Added pages')
+        else:
+            for _ in _store_pages(rendered):
+                pass
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    source.save_cache(site.get_source_cache_path())
 
     # Copy static files into Flask's static directory. If we're deploying
     # to a CDN, this should happen first so that Flask knows what it's
     # working with.
+    static_files = []
     for static_path, source_path in source.load_static_paths():
         _, fname = os.path.split(source_path)
         if fname.startswith('.') or static_path.startswith('.'):
             continue
         target_path = site.get_path_for_static(static_path)
-
-        # Make sure that the directory into which we're putting this static
-        # file actually exists.
-        target_dir, _ = os.path.split(target_path)
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
-
-        # This will overwrite whatever is already there.
         click.echo(f"Static: copy {static_path} to {target_path}")
-        shutil.copy(source_path, target_path)
+        static_files.append((source_path, target_path))
         if with_search:
             index.add_static_file(static_path)
+    _copy_files(static_files)
     click.echo('Added static files')
 
+    template_files = []
     for template_path, source_path in source.load_template_paths():
         target_path = site.get_path_for_template(template_path)
+        click.echo(f"Template: copy {template_path} to {target_path}")
+        template_files.append((source_path, target_path))
+    _copy_files(template_files)
+    click.echo('Added templates')
 
-        # Make sure that the directory into which we're putting this template
-        # file actually exists.
-        target_dir, _ = os.path.split(target_path)
-        if not os.path.exists(target_dir):
-            os.makedirs(target_dir)
 
-        # This will overwrite whatever is already there.
-        click.echo(f"Template: copy {template_path} to {target_path}")
+def _map_in_pool(executor: Executor, func: Callable, items: Iterable,
+                 max_pending: int, chunksize: int = 8) -> Iterable:
+    """
+    Map ``func`` over ``items`` in ``executor``, yielding results in order.
+
+    Unlike :meth:`.Executor.map`, this doesn't consume all of ``items`` up
+    front: at most ``max_pending`` chunks of ``chunksize`` items are in
+    flight at any one time. So pages are loaded as the workers are ready for
+    them, rather than all being held in memory at once.
+    """
+    items = iter(items)
+    chunks = iter(lambda: list(islice(items, chunksize)), [])
+    pending: Deque[Future] = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(_map_chunk, func, chunk))
+        if len(pending) >= max_pending:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+
+def _map_chunk(func: Callable, chunk: List) -> List:
+    return [func(item) for item in chunk]
+
+
+def _store_pages(rendered: Iterable[Tuple[str, str, dict, IndexablePage]]) \
+        -> Iterable[IndexablePage]:
+    """
+    Store rendered pages in the build directory.
+
+    Writes happen here in the main process, regardless of where the pages
+    were rendered.
+
+    Parameters
+    ----------
+    rendered : iterable
+        Yields the results of :func:`_render_one`.
+
+    Returns
+    -------
+    generator
+        Yields an :class:`.IndexablePage` for each page, once it is stored.
+
+    """
+    for page_path, template_content, metadata, indexable in rendered:
+        site.store_page_content(page_path, template_content)
+        site.store_metadata(page_path, metadata)
+        yield indexable
+
+
+def _copy_files(files: List[Tuple[str, str]]) -> None:
+    """
+    Copy files into the build directory.
+
+    Parameters
+    ----------
+    files : list
+        Items are Tuple[str, str], where the first element is the absolute
+        path to the file in the site source, and the second element is the
+        absolute path to which it should be copied.
+
+    """
+    # Make sure that the directories into which we're putting these files
+    # actually exist.
+    for target_dir in {os.path.dirname(target) for _, target in files}:
+        os.makedirs(target_dir, exist_ok=True)
+
+    # Copying is I/O-bound, so threads are fine here.
+    with ThreadPoolExecutor(max_workers=COPY_WORKERS) as executor:
+        for _ in executor.map(lambda paths: _copy_file(*paths), files):
+            pass
+
+
+def _copy_file(source_path: str, target_path: str) -> None:
+    """
+    Copy a single file, overwriting whatever is already at ``target_path``.
+
+    If the source and the build directory are on the same filesystem we can
+    just create a hard link, which doesn't copy any bytes at all. Otherwise
+    we fall back to a regular copy.
+    """
+    try:
+        os.unlink(target_path)
+    except FileNotFoundError:
+        pass
+    try:
+        os.link(source_path, target_path)
+    except OSError:
         shutil.copy(source_path, target_path)
-    click.echo('Added templates')
 
 
 @click.command()
@@ -100,7 +233,8 @@ def build(build_path: Optional[str] = None,
           instance_path: Optional[str] = None) -> None:
     app = create_web_app(build_path=build_path, instance_path=instance_path)
     with app.app_context():
-        _build_site(app.config.get('SITE_SEARCH_ENABLED', True))
+        _build_site(app.config.get('SITE_SEARCH_ENABLED', True),
+                    app.config.get('BUILD_PARALLEL', False))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,88 @@
+"""Fixtures shared by the marXdown tests."""
+
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Tuple
+
+import git
+import pytest
+from pytz import UTC
+
+
+class SiteSource(NamedTuple):
+    """A minimal site source in a Git repository."""
+
+    CONTENT: List[Tuple[str, str]]
+    site_dir: str
+    repo_path: str
+    source_path: str
+    repo: git.Repo
+    repo_name: str
+    created: Dict[str, datetime]
+    version: str
+
+
+CONTENT = [
+    ('index.md', '# This is the index\n\nHere is <a href="foo">link</a>.'),
+    ('foo.md', '# Another foo page\n\nSee also <a href="baz">baz</a>.'),
+    ('baz/index.md', '---\ntitle: Baz Page\n---\n# The baz index page'),
+    ('baz/redirectme.md',
+     '---\nresponse:\n  status: 301\n  location: ../foo\n---'),
+    ('baz/deleted.md', '---\nresponse:\n  deleted: true\n---\nNot here'),
+    ('notapage.txt', 'some non-markdown content here'),
+    ('baz/foo.dat', 'some more non-markdown content here'),
+    ('_hidden/baz.dat', 'this is not here'),
+    ('_templates/sometemplate.html', '<html><body>what</body></html>'),
+    ('_templates/notatemplate.txt', 'nope'),
+]
+
+
+@pytest.fixture(scope='session')
+def site_source(tmp_path_factory) -> SiteSource:
+    """
+    Create a minimal site source in a Git repository.
+
+    This is slow, and none of the tests change the source, so it is only
+    done once per test session. The repository is left for pytest to clean
+    up along with its other temporary directories.
+    """
+    site_dir = "test"
+    repo_path = str(tmp_path_factory.mktemp('source'))
+    source_path = os.path.join(repo_path, site_dir)
+    repo = git.Repo.init(repo_path)
+    repo_name = 'arxiv/foo'
+    repo.create_remote('origin', f'git@github.com:{repo_name}.git')
+    created = {}
+
+    # Add and commit files to the repo. Each commit is dated a second after
+    # the last, so that the creation times vary.
+    start = int(time.time()) - len(CONTENT)
+    for i, (path, content) in enumerate(CONTENT):
+        fpath = os.path.join(source_path, path)
+        parent, _ = os.path.split(fpath)
+        if not os.path.exists(parent):
+            os.makedirs(parent)
+        with open(fpath, 'w') as f:
+            f.write(content)
+        repo.index.add([fpath])
+        date = f'{start + i} +0000'
+        commit = repo.index.commit("added %s" % path, author_date=date,
+                                   commit_date=date)
+        created[path] = \
+            datetime.utcfromtimestamp(commit.committed_date).replace(tzinfo=UTC)
+    branch = repo.create_head('new')
+    repo.head.reference = branch
+    version = '0.4.5'
+    repo.create_tag(version, message='message!')
+
+    return SiteSource(CONTENT=CONTENT, site_dir=site_dir, repo_path=repo_path,
+                      source_path=source_path, repo=repo, repo_name=repo_name,
+                      created=created, version=version)
+
+
+@pytest.fixture(scope='class')
+def site_source_class(request, site_source: SiteSource) -> None:
+    """Make the :func:`site_source` available as attributes of a test class."""
+    for name, value in site_source._asdict().items():
+        setattr(request.cls, name, value)
@@ -1,8 +1,6 @@
 """Domain classes for arxiv-docs service."""
 
 from typing import Any, Optional, Type, NamedTuple, List, Tuple, Dict
-import bleach
-import markdown
 from mypy_extensions import TypedDict
 
 
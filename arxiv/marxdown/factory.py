@@ -1,6 +1,7 @@
 """Application factory for static site."""
 
 import logging
+from functools import lru_cache
 from typing import Optional
 from datetime import datetime
 import dateutil.parser
@@ -13,17 +14,31 @@ from . import routes, config
 
 s3 = FlaskS3()
 
+EASTERN = timezone('US/Eastern')
+
+
+@lru_cache(maxsize=4096)
+def _parse_date(datestring: str) -> datetime:
+    """
+    Parse a date string.
+
+    The same handful of dates show up again and again when rendering pages,
+    and :func:`dateutil.parser.parse` is slow, so we hang on to the results.
+    """
+    dt: datetime = dateutil.parser.parse(datestring)
+    return dt
+
 
 def format_datetime(datestring: str) -> str:
     """Render a date like ``Friday, January 01, 2019 at 22:05 US/Eastern``."""
-    dt = dateutil.parser.parse(datestring)
-    dt = dt.replace(tzinfo=timezone('US/Eastern'))
+    dt = _parse_date(datestring)
+    dt = dt.replace(tzinfo=EASTERN)
     return dt.strftime("%A, %B %m, %Y at %H:%M US/Eastern")
 
 
 def simpledate(datestring: str) -> str:
     """Render a date like ``1992-05-02``."""
-    dt = dateutil.parser.parse(datestring)
+    dt = _parse_date(datestring)
     return dt.strftime("%Y-%m-%d")
 
 
@@ -61,6 +76,7 @@ def create_web_app(build_path: Optional[str] = None,
         app.config.update(extra_config)
 
     Base(app)
+    s3.init_app(app)    # Settles FLASKS3_ACTIVE, used by the site blueprint.
 
     with app.app_context():     # Need the app context for the config to stick.
         # Provides base templates.
@@ -76,5 +92,4 @@ def create_web_app(build_path: Optional[str] = None,
     app.jinja_env.filters['simpledate'] = simpledate  # pylint: disable=no-member
     app.jinja_env.filters['pretty_path'] = pretty_path  # pylint: disable=no-member
 
-    s3.init_app(app)
     return app
@@ -1,13 +1,16 @@
 """Responsible for rendering markdown content to HTML."""
 
-from typing import Callable, Optional, Mapping, Union, Tuple, List
+from typing import Callable, Optional, Mapping, Union, Tuple, List, Match, \
+    Iterable
+import html
 import re
+import threading
 import warnings
-from functools import wraps
-import xml.etree.ElementTree as ET
-from markdown import markdown, Markdown
+from functools import lru_cache, wraps
+from markdown import Markdown
 from markdown.extensions import Extension
 from markdown.treeprocessors import Treeprocessor
+from markdown.util import etree, STX, ETX
 from mdx_partial_gfm import PartialGithubFlavoredMarkdownExtension
 
 from arxiv.base import logging
@@ -16,7 +19,21 @@ from .domain import SourcePage
 
 logger = logging.getLogger(__name__)
 
-ALLOWED_JINJA = r"\$jinja\s*{{ '([{}%]+)' }}([^{]+){{ '([{}%]+)' }}\s*jinja\$"
+ALLOWED_JINJA = r"\$jinja\s*([{}%]+)([^{}%]+)([{}%]+)\s*jinja\$"
+"""Jinja that is explicitly marked as such, and should not be escaped."""
+
+BRACES = r"([{}%]+)"
+"""Runs of characters that would otherwise be treated as Jinja syntax."""
+
+_ESCAPE = re.compile(f"{ALLOWED_JINJA}|{BRACES}")
+
+_STASHED = re.compile(f"{STX}(?:wzxhzdk:([0-9]+)|[^{ETX}]*){ETX}")
+"""Placeholders left in the document tree by the markdown processor."""
+
+_TAG = re.compile(r"<[^>]*>")
+
+_NOT_OURS = ('/', '#', 'mailto:')
+"""Prefixes of hrefs that should be left alone by the linker."""
 
 
 def render(content: str, dereferencer: Optional[Callable] = None) -> str:
@@ -30,9 +47,6 @@ def render(content: str, dereferencer: Optional[Callable] = None) -> str:
     dereferencer : function
         Used for generating URLs from internal paths and slugs. Should accept
         a HREF value (str), and return a URL (str). Optional.
-    static_dereferencer : function
-        Used for generating URLs for static files. Should accept
-        a src value (str), and return a URL (str). Optional.
 
     Returns
     -------
@@ -40,39 +54,53 @@ def render(content: str, dereferencer: Optional[Callable] = None) -> str:
         Rendered HTML.
 
     """
-    extensions = ['markdown.extensions.tables',
-                  'markdown.extensions.fenced_code',
-                  'markdown.extensions.codehilite',
-                  'markdown.extensions.toc',
-                  'markdown.extensions.attr_list',
-                  PartialGithubFlavoredMarkdownExtension(),
-                  StyleClassExtension(tag="table",
-                                      classes=["table", "is-striped"])]
-    if dereferencer is not None:
-        extensions.append(ReferenceExtension(tag='a', attr='href',
-                                             dereferencer=dereferencer))
-        extensions.append(ReferenceExtension(tag='img', attr='src',
-                                             dereferencer=dereferencer))
-
-    # The GFM extension doesn't implement the changes related to positional
-    # arguments described in the Markdown v2.6 release notes.
-    # https://python-markdown.github.io/change_log/release-2.6/#positional-arguments-deprecated
-    with warnings.catch_warnings():
-        warnings.simplefilter("ignore")
-        return escape_braces(markdown(content, extensions=extensions))
+    rendered, _ = render_with_text(content, dereferencer)
+    return rendered
+
+
+def render_with_text(content: str, dereferencer: Optional[Callable] = None) \
+        -> Tuple[str, str]:
+    """
+    Render markdown content to HTML, and extract its plain text.
+
+    The plain text is taken from the parsed document, so this is much cheaper
+    than stripping the tags from the rendered HTML.
+
+    Parameters
+    ----------
+    content : str
+        Markdown content.
+    dereferencer : function
+        See :func:`render`.
+
+    Returns
+    -------
+    str
+        Rendered HTML.
+    str
+        Plain text content. This is not escaped.
+
+    """
+    rendered, text = _markdown.convert(content, dereferencer)
+    return escape_braces(rendered), text
 
 
 def escape_braces(content: str) -> str:
     """
     Curly braces in content must be escaped.
 
-    Otherwise, they are treated as Jinja2 syntax.
+    Otherwise, they are treated as Jinja2 syntax. Jinja that is marked as such
+    (see :const:`ALLOWED_JINJA`) is unwrapped rather than escaped. This is
+    done in a single pass over the content.
     """
-    def repl(match):
-        print(match.groups())
-        return "foo"
-    return re.sub(ALLOWED_JINJA, r"\1\2\3",
-                  re.sub(r"([{}%]+)", r"{{ '\g<1>' }}", content))
+    return _ESCAPE.sub(_escape_match, content)
+
+
+def _escape_match(match: Match) -> str:
+    opening, jinja, closing, braces = match.groups()
+    if braces is not None:
+        return "{{ '%s' }}" % braces
+    return opening + jinja + closing
 
 
 class StyleClassProcessor(Treeprocessor):
@@ -83,56 +111,65 @@ class StyleClassProcessor(Treeprocessor):
         self.tag = tag
         self.classes = classes
 
-    def run(self, root: ET.ElementTree) -> None:
+    def run(self, root: etree.Element) -> None:
         """Add some CSS classes to a table when we find one."""
-        for child in root:
-            if child.tag == self.tag:
-                existing = child.attrib.get("class", "").split()
-                child.attrib["class"] = " ".join(existing + self.classes)
+        for element in root.iter(self.tag):
+            existing = element.get("class", "").split()
+            element.set("class", " ".join(existing + self.classes))
 
 
 class ReferenceProcessor(Treeprocessor):
     """Convert internal links to full paths."""
 
-    def __init__(self, tag: str = "a", attr: str = "href",
+    def __init__(self, targets: Iterable[Tuple[str, str]] = (('a', 'href'),),
                  dereferencer: Optional[Callable] = None) -> None:
-        """Set the link dereferencer for use during processing."""
+        """
+        Set the link dereferencer for use during processing.
+
+        Parameters
+        ----------
+        targets : iterable
+            Items are Tuple[str, str], where the first element is a tag name
+            and the second element is the attribute on that tag that holds a
+            reference to be converted.
+        dereferencer : function
+            See :func:`render`.
+
+        """
         self.dereferencer = dereferencer
-        self.tag = tag
-        self.attr = attr
+        self.targets = list(targets)
 
-    def run(self, root: ET.ElementTree) -> None:
+    def run(self, root: etree.Element) -> None:
         """Perform link conversion on ``root``."""
-        if self.dereferencer is not None:
-            self.translate_anchors(root)
-
-    def translate_anchors(self, element: ET.Element) -> None:
-        """Traverse ``element`` looking for and updating anchor elements."""
-        for child in element:
-            if child.tag == self.tag:
-                value = child.attrib.get(self.attr)
+        if self.dereferencer is None:
+            return
+        # Filtering by tag happens in C, so a pass per target is cheaper than
+        # a single pass that checks every element in Python.
+        for tag, attr in self.targets:
+            for element in root.iter(tag):
+                value = element.get(attr)
+                if value is None:
+                    continue
                 try:
-                    child.attrib[self.attr] = self.dereferencer(value)
+                    element.set(attr, self.dereferencer(value))
                 except KeyError:
                     continue
-            self.translate_anchors(child)
 
 
 class ReferenceExtension(Extension):
     """Adds :class:`.ReferenceProcessor` to the markdown processor."""
 
-    def __init__(self, tag: str = "a", attr: str = "href",
+    def __init__(self, targets: Iterable[Tuple[str, str]] = (('a', 'href'),),
                  dereferencer: Optional[Callable] = None) -> None:
         """Set the link dereferencer for use during processing."""
-        self.tag = tag
-        self.attr = attr
+        self.targets = targets
         self.dereferencer = dereferencer
 
     def extendMarkdown(self, md: Markdown, md_globals: Mapping) -> None:
         """Add :class:`.ReferenceProcessor` to the markdown processor."""
-        inst = ReferenceProcessor(tag=self.tag, attr=self.attr,
+        inst = ReferenceProcessor(targets=self.targets,
                                   dereferencer=self.dereferencer)
-        md.treeprocessors[f'{self.tag}_{self.attr}_reference_processor'] = inst
+        md.treeprocessors['reference_processor'] = inst
 
 
 class StyleClassExtension(Extension):
@@ -149,40 +186,153 @@ class StyleClassExtension(Extension):
         md.treeprocessors[f'{self.tag}_style_class_processor'] = inst
 
 
+class TextExtractor(Treeprocessor):
+    """
+    Extracts the plain text content of a document.
+
+    This should run after all of the other tree processors. Raw HTML in the
+    markdown source is still stashed at this point, so we pull the text out
+    of that too.
+    """
+
+    text = ''
+    """The plain text of the most recently processed document."""
+
+    def run(self, root: etree.Element) -> None:
+        """Extract the text from ``root``."""
+        self.text = _STASHED.sub(self._unstash, ''.join(root.itertext()))
+
+    def _unstash(self, match: Match) -> str:
+        if match.group(1) is None:  # Some other kind of placeholder.
+            return ''
+        raw_html, _ = self.markdown.htmlStash.rawHtmlBlocks[int(match.group(1))]
+        return html.unescape(_TAG.sub('', raw_html))
+
+
+class TextExtension(Extension):
+    """Adds :class:`.TextExtractor` to the markdown processor."""
+
+    def extendMarkdown(self, md: Markdown, md_globals: Mapping) -> None:
+        """Add :class:`.TextExtractor` to the end of the tree processors."""
+        md.treeprocessors.add('text_extractor', TextExtractor(md), '_end')
+
+
+class _ThreadLocalMarkdown(threading.local):
+    """
+    A :class:`.Markdown` processor that is built once per thread.
+
+    Building a :class:`.Markdown` instance registers all of the extensions,
+    which is expensive relative to converting a typical page. So we build one
+    per thread (or worker process) and :meth:`.Markdown.reset` it between
+    conversions. The reference processor is always registered; the
+    dereferencer is swapped in for each call to :func:`render`.
+    """
+
+    def __init__(self) -> None:
+        """Build the markdown processor."""
+        extensions = [
+            'markdown.extensions.tables',
+            'markdown.extensions.fenced_code',
+            'markdown.extensions.codehilite',
+            'markdown.extensions.toc',
+            'markdown.extensions.attr_list',
+            PartialGithubFlavoredMarkdownExtension(),
+            StyleClassExtension(tag="table", classes=["table", "is-striped"]),
+            ReferenceExtension(targets=[('a', 'href'), ('img', 'src')]),
+            TextExtension()
+        ]
+        # The GFM extension doesn't implement the changes related to
+        # positional arguments described in the Markdown v2.6 release notes.
+        # https://python-markdown.github.io/change_log/release-2.6/#positional-arguments-deprecated
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            self.md = Markdown(extensions=extensions)
+        self.reference_processor = self.md.treeprocessors['reference_processor']
+        self.text_extractor = self.md.treeprocessors['text_extractor']
+
+    def convert(self, content: str,
+                dereferencer: Optional[Callable] = None) -> Tuple[str, str]:
+        """
+        Convert ``content`` to HTML, using ``dereferencer`` for links.
+
+        Returns
+        -------
+        str
+            Rendered HTML.
+        str
+            Plain text content.
+
+        """
+        self.reference_processor.dereferencer = dereferencer
+        # Markdown returns early for blank content, without running the tree
+        # processors, so we mustn't hang on to the last page's text.
+        self.text_extractor.text = ''
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                rendered: str = self.md.reset().convert(content)
+        finally:
+            # Don't hold on to the page for which the dereferencer was made.
+            self.reference_processor.dereferencer = None
+        return rendered, self.text_extractor.text
+
+
+_markdown = _ThreadLocalMarkdown()
+
+
 def get_linker(page: SourcePage, site_name: str) -> Callable:
+    return _get_linker(_get_base_path(page), site_name)
+
+
+def get_deferencer(page: SourcePage, site_name: str) -> Callable:
+    return _get_dereferencer(_get_base_path(page), site_name)
+
+
+def _get_base_path(page: SourcePage) -> str:
+    return '/'.join(page.page_path.split('/')[:-1])
+
+
+def _get_linker(base_path: str, site_name: str) -> Callable:
+    # These don't depend on the href, so we work them out once per page
+    # rather than for every link on the page.
+    page_route = f'{site_name}.from_sitemap'
+    static_route = f'{site_name}.static'
+
     def linker(href: str) -> Tuple[str, str, str, Optional[str]]:
         # We don't want to mess with things that are clearly not ours to
         # fiddle with.
-        if not href \
-                or '://' in href \
-                or href.startswith('/') \
-                or href.startswith('#') \
-                or href.startswith('mailto:'):
+        if not href or href.startswith(_NOT_OURS) or '://' in href:
             return href, None, None, None
         anchor = None
         if '#' in href:
             href, anchor = href.split('#', 1)
-        if href.endswith('.md'):
+        if href[-3:] == '.md':
             path = href[:-3]
-            route = f'{site_name}.from_sitemap'
+            route = page_route
             kwarg = 'page_path'
-        elif '.' not in href.split('/')[-1]:
+        elif href.rfind('.') <= href.rfind('/'):     # No file extension.
             path = href
-            route = f'{site_name}.from_sitemap'
+            route = page_route
             kwarg = 'page_path'
         else:
             path = href
-            route = f'{site_name}.static'
+            route = static_route
             kwarg = 'filename'
-        base_path = '/'.join(page.page_path.split('/')[:-1])
         target_path = '/'.join([base_path, path.rstrip('/')]).lstrip('/')
         return route, kwarg, target_path, anchor
     return linker
 
 
-def get_deferencer(page: SourcePage, site_name: str) -> Callable:
+@lru_cache(maxsize=256)
+def _get_dereferencer(base_path: str, site_name: str) -> Callable:
+    # Dereferencing only depends on the directory that the page is in, so
+    # pages in the same directory share a dereferencer. Links that show up
+    # on many pages (e.g. back to an index) are only worked out once.
+    linker = _get_linker(base_path, site_name)
+
+    @lru_cache(maxsize=4096)
     def link_dereferencer(href: str) -> str:
-        route, kwarg, target_path, anchor = get_linker(page, site_name)(href)
+        route, kwarg, target_path, anchor = linker(href)
         if kwarg is None:
             return route
         if anchor is not None:
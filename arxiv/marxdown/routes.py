@@ -1,13 +1,15 @@
 """URL routes for the marXdown application."""
 
-from typing import Dict, Callable, Optional, Tuple
+from functools import lru_cache, partial
+from typing import Any, Dict, Callable, Optional, Tuple
 from werkzeug.urls import url_parse, url_unparse, url_encode
 
 from werkzeug.exceptions import NotFound
 import jinja2
 from flask_s3 import url_for as s3_url_for
-from flask import Flask, Blueprint, render_template_string, request, \
-    render_template, current_app, url_for, redirect, Response
+from flask import Flask, Blueprint, request, render_template, current_app, \
+    url_for, redirect, Response
+from flask.signals import before_render_template, template_rendered
 
 from arxiv import status
 from arxiv.base import logging
@@ -20,35 +22,33 @@ logger = logging.getLogger(__name__)
 ResponseTuple = Tuple[str, int, dict]
 
 
-def redirect_html(page_path: str = '') -> Response:
+def redirect_html(page_path: str = '', *, site_name: str) -> Response:
     """Redirect .htm and .html to their bare equivalents."""
     try:
         page = site.load_page(page_path)
     except site.PageNotFound:
         raise NotFound('No such page')
-    site_name = site.get_site_name()
     target = url_for(f'{site_name}.from_sitemap', page_path=page_path)
     response: Response = redirect(target, status.HTTP_302_FOUND)
     return response
 
 
-def from_sitemap(page_path: str = '') -> ResponseTuple:
-    """Handle a request for ``page_path``."""
-    # If static files are up in S3, we want to generate static URLs for S3
-    # rather than local ones.
-    if current_app.config['FLASKS3_ACTIVE']:
-        logger.debug('use S3 for static files')
-        this_url_for = s3_url_for
-    else:
-        this_url_for = url_for
+def from_sitemap(page_path: str = '', *, site_name: str,
+                 this_url_for: Callable) -> ResponseTuple:
+    """
+    Handle a request for ``page_path``.
 
+    ``site_name`` and ``this_url_for`` don't change over the life of the app,
+    so they are bound when the blueprint is created; see
+    :func:`get_blueprint`.
+    """
     try:
         page = site.load_page(page_path)
     except site.PageNotFound:
         # This may be a request for a static URL, e.g. if there exists a
         # direct link from another site.
         if index.static_exists(page_path):
-            static_url = this_url_for(f'{site.get_site_name()}.static',
+            static_url = this_url_for(f'{site_name}.static',
                                       filename=page_path)
             logger.debug('Redirect to %s', static_url)
             return redirect(static_url, code=status.HTTP_302_FOUND)
@@ -62,7 +62,7 @@ def from_sitemap(page_path: str = '') -> ResponseTuple:
     if 'response' in page.metadata:
         code = page.metadata['response'].get('status', status.HTTP_200_OK)
         if 'location' in page.metadata['response']:
-            linker = render.get_linker(page, site.get_site_name())
+            linker = render.get_linker(page, site_name)
             location_rel = page.metadata['response']['location']
             route, kwarg, name, anchor = linker(location_rel)
             if kwarg is None:
@@ -84,14 +84,42 @@ def from_sitemap(page_path: str = '') -> ResponseTuple:
     context.update({
         'page_path': page_path,
         'page': page,
-        'site_name': site.get_site_name(),
+        'site_name': site_name,
         'url_for': this_url_for,
         'pagetitle': page.metadata['title']     # ARXIVNG-1697
     })
-    content = render_template_string(page.content, **context)
+    content = _render_page(page.content, **context)
     return content, code, headers
 
 
+def _render_page(source: str, **context: Any) -> str:
+    """
+    Render the (Jinja) content of a built page.
+
+    This is equivalent to :func:`flask.render_template_string`, except that
+    the compiled template is cached.
+    """
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    template = _compile_page(app.jinja_env, source)
+    before_render_template.send(app, template=template, context=context)
+    content: str = template.render(context)
+    template_rendered.send(app, template=template, context=context)
+    return content
+
+
+@lru_cache(maxsize=1024)
+def _compile_page(env: jinja2.Environment, source: str) -> jinja2.Template:
+    """
+    Compile the (Jinja) content of a built page.
+
+    Built pages don't change while the site is being served, so there is no
+    need to compile them on every request. We key on the source itself
+    rather than the page path, so that a rebuilt page is never served stale.
+    """
+    return env.from_string(source)
+
+
 def search() -> ResponseTuple:
     """Handle a search request."""
     q = request.args.get('q')
@@ -124,16 +152,34 @@ def url_for_page_builder() -> Dict[str, Callable]:
 
 
 def get_blueprint(site_path: str, with_search: bool = True) -> Blueprint:
-    """Generate a blueprint for this site on the fly."""
-    blueprint = Blueprint(site.get_site_name(), __name__,
+    """
+    Generate a blueprint for this site on the fly.
+
+    This must be called after Flask-S3 is initialized on the current app,
+    since that is when ``FLASKS3_ACTIVE`` is settled.
+    """
+    site_name = site.get_site_name()
+    blueprint = Blueprint(site_name, __name__,
                           url_prefix=site.get_url_prefix(),
                           static_folder=site.get_static_path(),
                           template_folder=site.get_templates_path(),
-                          static_url_path=f'{site.get_site_name()}_static')
-    blueprint.route('/')(from_sitemap)
-    blueprint.route('/<path:page_path>')(from_sitemap)
-    blueprint.route('/<path:page_path>.html', endpoint="html")(redirect_html)
-    blueprint.route('/<path:page_path>.htm', endpoint="htm")(redirect_html)
+                          static_url_path=f'{site_name}_static')
+
+    # If static files are up in S3, we want to generate static URLs for S3
+    # rather than local ones.
+    if current_app.config['FLASKS3_ACTIVE']:
+        logger.debug('use S3 for static files')
+        this_url_for = s3_url_for
+    else:
+        this_url_for = url_for
+
+    page_view = partial(from_sitemap, site_name=site_name,
+                        this_url_for=this_url_for)
+    redirect_view = partial(redirect_html, site_name=site_name)
+    blueprint.add_url_rule('/', 'from_sitemap', page_view)
+    blueprint.add_url_rule('/<path:page_path>', 'from_sitemap', page_view)
+    blueprint.add_url_rule('/<path:page_path>.html', 'html', redirect_view)
+    blueprint.add_url_rule('/<path:page_path>.htm', 'htm', redirect_view)
     if with_search:
         blueprint.route('/search', methods=['GET'])(search)
     blueprint.context_processor(url_for_page_builder)
@@ -58,8 +58,7 @@ def create_index() -> index.Index:
     index_path = _get_index_path()
     static_index_path = _get_static_index_path()
     for path in [index_path, static_index_path]:
-        if not os.path.exists(path):
-            os.makedirs(path)
+        os.makedirs(path, exist_ok=True)
     index.create_in(index_path, SCHEMA)
     index.create_in(static_index_path, STATIC_SCHEMA)
 
@@ -1,14 +1,16 @@
 """Provides an interface to the built site at runtime."""
 
-from typing import Iterable, Tuple, Dict
+from typing import Iterable, Tuple, Dict, List
 
 import os
 import json
+from functools import lru_cache
 
 from arxiv.base.globals import get_application_config as config
 from arxiv.util.serialize import ISO8601JSONEncoder
 from arxiv.base import logging
 from ..domain import Page, SiteTree
+from ..util import walk_files
 
 logger = logging.getLogger(__name__)
 
@@ -21,8 +23,7 @@ def create_all(site_path: str) -> None:
     """Create all build paths required for the site."""
     for path in [get_static_path(), get_data_path(), get_pages_path(),
                  get_templates_path()]:
-        if not os.path.exists(path):
-            os.makedirs(path)
+        os.makedirs(path, exist_ok=True)
 
 
 def walk() -> Iterable[Tuple[str, str, dict]]:
@@ -36,29 +37,33 @@ def walk() -> Iterable[Tuple[str, str, dict]]:
 
     """
     prefix = get_url_prefix()
-    for parent, dirs, files in os.walk(get_pages_path()):
-        for fname in files:
-            child = fname.rsplit('.j2', 1)[0]
-            rel_parent = parent.split(get_pages_path().rstrip("/"), 1)[1]
-            this_parent = str(rel_parent)
-            if not this_parent.startswith("/"):
-                this_parent = "/" + this_parent
-
-            # /foo/bar, index -> /foo, bar
-            if child == "index":
-                this_parent, child = this_parent.rsplit('/', 1)
-            if not this_parent.startswith("/"):
-                this_parent = "/" + this_parent
-
-            if this_parent == "/":  # Avoid a double slash.
-                pattern = prefix.rstrip("/") + "/" + child
-            else:
-                pattern = prefix.rstrip("/") + this_parent + "/" + child
-
-            # load_metadata needs actual file name (e.g. 'index')
-            path = (rel_parent + "/" + fname.rsplit('.j2', 1)[0]).lstrip("/")
-            this_parent = prefix + this_parent
-            yield this_parent, pattern.rstrip("/"), load_metadata(path)
+    prefix_base = prefix.rstrip("/")
+    pages_path = get_pages_path().rstrip("/")
+    for parent, entry in walk_files(pages_path):
+        fname = entry.name
+        # load_metadata needs actual file name (e.g. 'index')
+        name = fname[:-3] if fname.endswith('.j2') else fname
+        rel_parent = parent[len(pages_path):]
+        path = f'{rel_parent}/{name}'.lstrip("/")
+
+        child = name
+        this_parent = rel_parent
+        if not this_parent.startswith("/"):
+            this_parent = "/" + this_parent
+
+        # /foo/bar, index -> /foo, bar
+        if child == "index":
+            this_parent, child = this_parent.rsplit('/', 1)
+        if not this_parent.startswith("/"):
+            this_parent = "/" + this_parent
+
+        if this_parent == "/":  # Avoid a double slash.
+            pattern = prefix_base + "/" + child
+        else:
+            pattern = prefix_base + this_parent + "/" + child
+
+        this_parent = prefix + this_parent
+        yield this_parent, pattern.rstrip("/"), load_metadata(path)
 
 
 def get_tree() -> SiteTree:
@@ -81,33 +86,43 @@ def get_tree() -> SiteTree:
         }
     }
 
-    def _get_subpaths(parent: str) -> Iterable[str]:
+    # Each subpath extends the one before it, so they come out shortest
+    # first without sorting.
+    def _get_subpaths(parent: str) -> List[str]:
         parent_parts = [prefix] \
             + parent.split(prefix, 1)[1].strip("/").split("/")
-        subpaths = set()
+        subpaths: List[str] = []
         subpath = ""
         for part in parent_parts:
             subpath = subpath.rstrip("/") + "/" + part.strip("/")
             if len(subpath) > 1 and subpath.endswith("/"):
                 subpath = subpath[:-1]
-            subpaths.add(subpath)
-        return sorted(subpaths, key=len)
+            if not subpaths or subpaths[-1] != subpath:
+                subpaths.append(subpath)
+        return subpaths
 
+    parents: Dict[str, dict] = {}
     for parent, pattern, metadata in walk():
         if 'response' in metadata:
             if metadata['response'].get('deleted'):
                 continue
             elif int(metadata['response'].get('status', 200)) > 299:
                 continue
-        subtree = tree[prefix]
-        for subpath in _get_subpaths(parent):
-            if subpath != subtree['path']:
-                if subpath not in subtree['children']:
-                    subtree['children'][subpath] = {
-                        'children': {},
-                        'path': subpath
-                    }
-                subtree = subtree['children'][subpath]
+        # Pages in the same directory have the same parent, and nodes are
+        # never replaced once they are added, so we only need to descend
+        # the tree once for each parent.
+        subtree = parents.get(parent)
+        if subtree is None:
+            subtree = tree[prefix]
+            for subpath in _get_subpaths(parent):
+                if subpath != subtree['path']:
+                    if subpath not in subtree['children']:
+                        subtree['children'][subpath] = {
+                            'children': {},
+                            'path': subpath
+                        }
+                    subtree = subtree['children'][subpath]
+            parents[parent] = subtree
         if pattern == subtree['path']:
             subtree.update({
                 'title': metadata['title'],
@@ -129,12 +144,23 @@ def get_tree() -> SiteTree:
     return tree
 
 
+@lru_cache(maxsize=64)
+def _get_build_subpath(build_path: str, *parts: str) -> str:
+    """
+    Get the absolute path for a directory in the build.
+
+    These are needed over and over (e.g. for every page), so we hang on to
+    them. This is keyed on the config values themselves, so it stays correct
+    if the config changes. Note that a relative ``build_path`` is resolved
+    against the working directory at the time of the first call.
+    """
+    return os.path.abspath(os.path.join(build_path, *parts))
+
+
 def get_static_path() -> str:
     """Get the absolute path for the site static directory."""
     build_path = config().get('BUILD_PATH', './')
-    logger.debug('get static path with build path %s, site name %s',
-                 build_path, get_site_name())
-    return os.path.abspath(os.path.join(build_path, 'static', get_site_name()))
+    return _get_build_subpath(build_path, 'static', get_site_name())
 
 
 def get_site_name() -> str:
@@ -159,22 +185,28 @@ def get_site_human_short_name() -> str:
 
 def get_data_path() -> str:
     """Get the absolute path for the site data directory."""
-    return os.path.abspath(
-        os.path.join(config().get('BUILD_PATH', './'), 'data'))
+    return _get_build_subpath(config().get('BUILD_PATH', './'), 'data')
 
 
 def get_templates_path() -> str:
     """Get the absolute path for the site templates directory."""
-    return os.path.abspath(
-        os.path.join(config().get('BUILD_PATH', './'), 'templates'))
+    return _get_build_subpath(config().get('BUILD_PATH', './'), 'templates')
 
 
 def get_pages_path() -> str:
     """Get the absolute path for the site pages directory."""
-    return os.path.abspath(
-        os.path.join(config().get('BUILD_PATH', './'), 'pages'))
+    return _get_build_subpath(config().get('BUILD_PATH', './'), 'pages')
+
+
+def get_source_cache_path() -> str:
+    """Get the absolute path for the cache of parsed site source."""
+    return _get_build_subpath(config().get('BUILD_PATH', './'),
+                              '.source_cache')
 
 
+# The build paths are absolute and normalized, and the paths that we put in
+# them are relative with forward slashes, so we don't need os.path.join.
+
 def get_page_filename(page_path: str) -> str:
     """Generate a filename for a rendered page."""
     return f'{page_path}.j2'
@@ -182,33 +214,31 @@ def get_page_filename(page_path: str) -> str:
 
 def get_path_for_page(page_path: str) -> str:
     """Generate an absolute path for a rendered page."""
-    return os.path.join(get_pages_path(), get_page_filename(page_path))
+    return f'{get_pages_path()}/{get_page_filename(page_path)}'
 
 
 def get_path_for_static(static_path: str) -> str:
-    return os.path.join(get_static_path(), static_path)
+    return f'{get_static_path()}/{static_path}'
 
 
 def get_path_for_template(template_path: str) -> str:
-    return os.path.join(get_templates_path(), template_path)
+    return f'{get_templates_path()}/{template_path}'
 
 
 def get_path_for_data(page_path: str) -> str:
-    return os.path.join(get_data_path(), f'{page_path}.json')
+    return f'{get_data_path()}/{page_path}.json'
 
 
 def store_metadata(page_path: str, data: dict) -> None:
     parent_dir, _ = os.path.split(get_path_for_data(page_path))
-    if not os.path.exists(parent_dir):
-        os.makedirs(parent_dir)
+    os.makedirs(parent_dir, exist_ok=True)
     with open(get_path_for_data(page_path), 'w') as f:
         json.dump(data, f, cls=ISO8601JSONEncoder)
 
 
 def store_page_content(page_path: str, content: str) -> None:
     parent_dir, _ = os.path.split(get_path_for_page(page_path))
-    if not os.path.exists(parent_dir):
-        os.makedirs(parent_dir)
+    os.makedirs(parent_dir, exist_ok=True)
     with open(get_path_for_page(page_path), 'w') as f:
         f.write(content)
 
@@ -216,27 +246,31 @@ def store_page_content(page_path: str, content: str) -> None:
 def load_page_content(page_path: str) -> str:
     if get_pages_path() not in os.path.normpath(get_path_for_page(page_path)):
         raise PageNotFound(f'Page {page_path} not found')
-
-    with open(get_path_for_page(page_path), 'rb') as f:
-        return f.read().decode('utf-8')
+    try:
+        with open(get_path_for_page(page_path), 'rb') as f:
+            return f.read().decode('utf-8')
+    except FileNotFoundError as e:
+        raise PageNotFound(f'Page {page_path} not found') from e
 
 
 def load_metadata(page_path: str) -> dict:
-    if not os.path.exists(get_path_for_data(page_path)):
+    try:
+        with open(get_path_for_data(page_path), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
         return {}
-    with open(get_path_for_data(page_path), 'r') as f:
-        return json.load(f)
 
 
 def load_page(page_path: str) -> Page:
-    if not os.path.exists(get_path_for_page(page_path)):
-        index_path = os.path.join(page_path, 'index')
-        if os.path.exists(get_path_for_page(index_path)):
-            page_path = index_path
-        else:
-            raise PageNotFound(f'Page {page_path} not found')
+    # Just try to open the page, rather than checking whether it exists
+    # first; most of the time it does.
+    try:
+        content = load_page_content(page_path)
+    except PageNotFound:
+        page_path = os.path.join(page_path, 'index')
+        content = load_page_content(page_path)
     return Page(
         page_path=page_path,
-        content=load_page_content(page_path),
+        content=content,
         metadata=load_metadata(page_path)
     )
@@ -1,52 +1,89 @@
 """API for loading content from a markdown site source."""
 
+import io
 import os
 import re
 from datetime import datetime
 from pytz import UTC
 import frontmatter
+import pickle
 import subprocess
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from functools import lru_cache as memoize
 from typing import NamedTuple
-from typing import Optional, List, Tuple, Iterable, Dict
-import git
+from typing import Optional, List, Tuple, Iterable, Dict, FrozenSet, Any, \
+    Deque
 from arxiv.base.globals import get_application_config as config
 from arxiv.base import logging
 
 from ..domain import SourcePage
+from ..util import walk_files
 
 logger = logging.getLogger(__name__)
 
-GIT_REF = re.compile(r"git@github\.com:([^\.]+)\.git")
+GIT_REF = re.compile(r"(?:git@github\.com:|https://github\.com/)"
+                     r"([^/]+/[^/]+?)(?:\.git)?/?")
+"""Matches (SSH or HTTPS) GitHub remote URLs, capturing the repo name."""
 GITHUB_COM = "https://github.com"
 
+LOAD_WORKERS = 4
+"""Number of threads used to load source pages."""
+
+CACHE_MIN_AGE = 2
+"""
+Files modified less than this many seconds ago are not cached.
+
+Some filesystems only record modification times to the nearest second or
+two, so a file rewritten soon after we read it could look unchanged.
+"""
+
+_FrontmatterKey = Tuple[int, int]
+_FrontmatterEntry = Tuple[_FrontmatterKey, Dict[str, Any], str]
+
+_frontmatter_cache: Dict[str, _FrontmatterEntry] = {}
+"""Parsed frontmatter from a previous build, by absolute source path."""
+
+_frontmatter_used: Dict[str, _FrontmatterEntry] = {}
+"""Parsed frontmatter for the source files read in this build."""
+
 
 @memoize()
 def get_repo_path(source_path: str) -> str:
+    # Different spellings of the same directory are the same repository.
+    return _get_repo_path(os.path.realpath(source_path))
+
+
+@memoize()
+def _get_repo_path(source_path: str) -> str:
     logger.debug('Get repository path for %s', source_path)
-    r = subprocess.run("git rev-parse --show-toplevel", cwd=source_path,
-                       shell=True, stdout=subprocess.PIPE,
-                       stderr=subprocess.PIPE)
+    r = subprocess.run(['git', 'rev-parse', '--show-toplevel'],
+                       cwd=source_path, stdout=subprocess.PIPE,
+                       stderr=subprocess.DEVNULL)
     path = r.stdout.decode('utf-8').strip()
     if path.startswith("/private"):
         return path.split("/private", 1)[1]
     return path
 
 
-@memoize()
-def _get_repo(source_path: str) -> git.Repo:
-    logger.debug('Get repository for source path %s', source_path)
-    return git.Repo(get_repo_path(source_path))
+def _git(source_path: str, *args: str) -> List[str]:
+    """Run a git command in the repository, and get the lines of output."""
+    r = subprocess.run(['git', *args], cwd=get_repo_path(source_path),
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return r.stdout.decode('utf-8').splitlines()
 
 
 @memoize()
 def _get_repo_name(source_path: str) -> Optional[str]:
     logger.debug('Get repository name for source path %s', source_path)
-    repo = _get_repo(source_path)
-    remotes = list(repo.remotes[0].urls)
+    # The URLs of the remotes, in the order that they are configured.
+    remotes = [line.split(' ', 1)[1] for line in
+               _git(source_path, 'config', '--get-regexp',
+                    r'^remote\..*\.url$')]
     if not remotes:
         return None
-    match = GIT_REF.match(remotes[0])
+    match = GIT_REF.fullmatch(remotes[0])
     if not match:
         return None
     return match.groups()[0]
@@ -55,34 +92,86 @@ def _get_repo_name(source_path: str) -> Optional[str]:
 @memoize()
 def _get_path_in_repo(source_path: str, page_path: str) -> str:
     logger.debug('Get page %s for source path %s', page_path, source_path)
+    site_dir = _get_source_path_in_repo(source_path)
+    if not site_dir:
+        return f'{page_path}.md'
+    return f'{site_dir}/{page_path}.md'
+
+
+@memoize()
+def _get_source_path_in_repo(source_path: str) -> str:
+    """Get the path to the site source relative to the repository root."""
+    # The repository path may be missing a leading /private (see
+    # get_repo_path), so we can't just use os.path.relpath.
     repo_path = get_repo_path(source_path)
-    return get_path_for_page(page_path).split(repo_path, 1)[1].lstrip("/")
+    return source_path.split(repo_path, 1)[1].strip("/")
+
+
+class _Commit(NamedTuple):
+    """The bits of a commit that we care about."""
+
+    sha: str
+    committed_date: int
+    message: str
+
+
+@memoize()
+def _get_commit_index(source_path: str) -> Dict[str, List[_Commit]]:
+    """
+    Get the commits that touched each file in the repository.
+
+    Asking git about each page separately means walking the whole history
+    once per page. Instead, we walk it once and hang on to the commits for
+    each path (relative to the root of the repository), newest first.
+
+    Rename detection is turned off, so that a commit that moves a file is
+    listed against both the old and the new path (like a path-limited
+    ``git rev-list``). It also means that git doesn't need the contents of
+    the files, which partial clones would otherwise go and fetch.
+    """
+    logger.debug('Get commit index for source %s', source_path)
+    r = subprocess.run(['git', 'log', '-z', '--name-only', '--no-renames',
+                        '--format=%x01%H%x00%ct%x00%B'],
+                       cwd=get_repo_path(source_path),
+                       stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    if r.returncode != 0:
+        # Carrying on would quietly drop the history of every page.
+        stderr = r.stderr.decode('utf-8', 'replace')
+        raise RuntimeError(
+            f'Could not get commit log for source {source_path}: {stderr}'
+        )
+    commits: Dict[str, List[_Commit]] = {}
+    for record in r.stdout.decode('utf-8', 'replace').split('\x01')[1:]:
+        sha, committed_date, message, *paths = record.split('\x00')
+        commit = _Commit(sha, int(committed_date), message.strip())
+        for path in paths:
+            path = path.lstrip('\n')
+            if path:
+                commits.setdefault(path, []).append(commit)
+    return commits
 
 
 @memoize()
-def _get_last_commit(source_path: str, page_path: str) -> Optional[git.Commit]:
+def _get_last_commit(source_path: str, page_path: str) -> Optional[_Commit]:
     logger.debug('Get last commit for %s in source %s', page_path, source_path)
     fpath = _get_path_in_repo(source_path, page_path)
-    repo = _get_repo(source_path)
-    commits = list(repo.iter_commits(paths=fpath, max_count=1))
+    commits = _get_commit_index(source_path).get(fpath)
     if not commits:
         return None
-    commit: git.Commit = commits[0]
-    return commit
+    return commits[0]
 
 
 def _get_revision_history(source_path: str, page_path: str) \
         -> List[Tuple[Optional[str], datetime, str]]:
     logger.debug('Get rev history for %s in source %s', page_path, source_path)
     fpath = _get_path_in_repo(source_path, page_path)
-    repo = _get_repo(source_path)
     return [
         (
-            _github_url(source_path, c.name_rev.split()[0], page_path),
+            _github_url(source_path, c.sha, page_path),
             datetime.utcfromtimestamp(c.committed_date).replace(tzinfo=UTC),
-            c.message.strip()
+            c.message
         )
-        for c in repo.iter_commits(paths=fpath)
+        for c in _get_commit_index(source_path).get(fpath, [])
     ]
 
 
@@ -92,7 +181,7 @@ def _get_mtime(source_path: str, page_path: str) -> datetime:
     if commit is not None:  # Use the time of the last commit, if possible.
         mt = datetime.utcfromtimestamp(commit.committed_date)
     else:   # Just use the filesystem modified time.
-        path = get_path_for_page(page_path)
+        path = _get_path_for_page(source_path, page_path)
         mt = datetime.utcfromtimestamp(os.path.getmtime(path))
     mt = mt.replace(tzinfo=UTC)     # Localize.
     return mt
@@ -101,8 +190,10 @@ def _get_mtime(source_path: str, page_path: str) -> datetime:
 @memoize()
 def _get_last_version(source_path: str) -> str:
     logger.debug('Get last version for source %s', source_path)
-    repo = _get_repo(source_path)
-    return repo.tags[-1].name
+    # Tags are listed by name, so this is the last tag in that order.
+    tags = _git(source_path, 'for-each-ref', '--format=%(refname:short)',
+                'refs/tags')
+    return tags[-1]
 
 
 def _github_url(source_path, rev, page_path) -> Optional[str]:
@@ -121,7 +212,7 @@ def _get_last_modified_url(source_path: str, page_path: str) -> Optional[str]:
                  page_path, source_path)
     commit = _get_last_commit(source_path, page_path)
     if commit is not None:
-        rev = commit.name_rev[:8]
+        rev = commit.sha[:8]
         return _github_url(source_path, rev, page_path)
     return None
 
@@ -138,12 +229,14 @@ def _get_last_version_url(source_path: str) -> Optional[str]:
 
 def get_source_path() -> str:
     """Get the absolute path to the site source."""
-    return os.path.abspath(config().get('SOURCE_PATH', './'))
+    return _get_abspath(config().get('SOURCE_PATH', './'))
 
 
-def get_templates_path() -> str:
-    """Get the absolute path to the templates in the site source."""
-    return os.path.join(get_source_path(), '_templates')
+@memoize(maxsize=64)
+def _get_abspath(source_path: str) -> str:
+    # Keyed on the configured value, so that this stays correct if the config
+    # changes; see :func:`.site._get_build_subpath`.
+    return os.path.abspath(source_path)
 
 
 def get_path_for_page(page_path: str) -> str:
@@ -151,10 +244,34 @@ def get_path_for_page(page_path: str) -> str:
     return os.path.join(get_source_path(), f'{page_path}.md')
 
 
+def _get_path_for_page(source_path: str, page_path: str) -> str:
+    # Unlike get_path_for_page, this doesn't need the application config, so
+    # it can be used outside of the application context (e.g. in threads).
+    return os.path.join(source_path, f'{page_path}.md')
+
+
 @memoize(maxsize=1024)
 def page_exists(source_path: str, page_path: str) -> bool:
     """Check whether a source page exists."""
-    return os.path.exists(get_path_for_page(page_path))
+    parent, name = os.path.split(page_path)
+    return f'{name}.md' in _list_dir(source_path, parent)
+
+
+@memoize(maxsize=256)
+def _list_dir(source_path: str, dir_path: str) -> FrozenSet[str]:
+    """
+    Get the names of the entries in a directory in the site source.
+
+    Most of the time that we check whether a page exists, it doesn't (e.g.
+    looking for parents in :func:`get_parents`), and we ask about the same
+    few directories over and over. Listing each directory once answers all
+    of those questions without any more trips to the filesystem.
+    """
+    try:
+        with os.scandir(os.path.join(source_path, dir_path)) as entries:
+            return frozenset(entry.name for entry in entries)
+    except (FileNotFoundError, NotADirectoryError):
+        return frozenset()
 
 
 def get_parents(source_path: str, page_path: str) -> List[Dict[str, str]]:
@@ -164,29 +281,33 @@ def get_parents(source_path: str, page_path: str) -> List[Dict[str, str]]:
     for i in range(1, len(path_parts)):
         path = '/'.join(path_parts[:i])
         if page_exists(source_path, path):
-            parent_page = load_page(source_path, path, False)
             parents.append({'page_path': path,
-                            'title': parent_page.title})
+                            'title': _get_page_title(source_path, path)})
         elif page_exists(source_path, f'{path}/index'):
-            parent_page = load_page(source_path, f'{path}/index', False)
+            title = _get_page_title(source_path, f'{path}/index')
             parents.append({'page_path': f'{path}/index',
-                            'title': parent_page.title,
+                            'title': title,
                             'path_for_reference': path})
     return parents
 
 
+@memoize(maxsize=1024)
+def _get_page_title(source_path: str, page_path: str) -> str:
+    """Get the title of a source page, without loading the rest of it."""
+    page_data = _load_frontmatter(_get_path_for_page(source_path, page_path))
+    return _get_title(page_data, page_path)
+
+
 @memoize(maxsize=1024)
 def load_page(source_path: str, page_path: str, parents: bool = True) \
         -> SourcePage:
     """Load content and data for a source page."""
-    page_data = frontmatter.load(get_path_for_page(page_path))
-    if parents:
-        parents = get_parents(source_path, page_path)
-    else:
-        parents = []
+    page_data = _load_frontmatter(_get_path_for_page(source_path, page_path))
+    page_parents = get_parents(source_path, page_path) if parents else []
     metadata = {k: v for k, v in page_data.metadata.items()}
-    metadata['parents'] = parents
-    metadata['title'] = _get_title(page_data, page_path)
+    metadata['parents'] = page_parents
+    title = _get_title(page_data, page_path)
+    metadata['title'] = title
     metadata['modified'] = _get_mtime(source_path, page_path)
     metadata['version'] = _get_last_version(source_path)
     metadata['source_url'] = _get_last_modified_url(source_path, page_path)
@@ -195,84 +316,210 @@ def load_page(source_path: str, page_path: str, parents: bool = True) \
 
     return SourcePage(
         page_path=page_path,
-        title=_get_title(page_data, page_path),
+        title=title,
         content=page_data.content,
         metadata=metadata,
         template=page_data.get('template'),
-        parents=parents
+        parents=page_parents
     )
 
 
-def load_pages() -> Iterable[SourcePage]:
-    """(Lazily) load all pages in the site source."""
-    source_path = get_source_path()
-    for dirpath, dirnames, filenames in os.walk(source_path):
-        for filename in filenames:
-            if filename.endswith('.md'):
-                full_path = os.path.join(dirpath, filename)
-                page_path = full_path.split(source_path, 1)[1][1:-3]
-                yield load_page(source_path, page_path)
+def _load_frontmatter(path: str) -> frontmatter.Post:
+    """
+    Parse the frontmatter and content of a source file.
+
+    Parsing the YAML frontmatter is a good part of the cost of loading a
+    page, and most pages don't change from one build to the next. So if
+    :func:`load_cache` was called, we reuse the result from the last build
+    (or from earlier in this one) for files whose modification time and size
+    have not changed.
+    """
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _frontmatter_used.get(path) or _frontmatter_cache.get(path)
+    if cached is not None and cached[0] == key:
+        _, metadata, content = cached
+    else:
+        with open(path, 'rb') as f:
+            raw = f.read()
+            # Key on what we actually read, in case it changed since stat.
+            stat = os.fstat(f.fileno())
+            key = (stat.st_mtime_ns, stat.st_size)
+        post = frontmatter.loads(raw.decode('utf-8'))
+        metadata, content = post.metadata, post.content
+    if time.time() - stat.st_mtime > CACHE_MIN_AGE:
+        _frontmatter_used[path] = (key, metadata, content)
+    page_data = frontmatter.Post(content)
+    page_data.metadata.update(metadata)
+    return page_data
+
+
+def load_cache(cache_path: str) -> None:
+    """
+    Load parsed frontmatter saved by :func:`save_cache` in a previous build.
+
+    If the cache can't be read for any reason, we just start from scratch.
+    This also starts a new build, so we forget the files that were read for
+    the last one (e.g. for another site built by the same process).
+    """
+    global _frontmatter_cache, _frontmatter_used
+    _frontmatter_used = {}
+    try:
+        with open(cache_path, 'rb') as f:
+            _frontmatter_cache = pickle.load(f)
+    except FileNotFoundError:
+        _frontmatter_cache = {}
+    except Exception as e:
+        logger.warning('Could not load source cache %s: %s', cache_path, e)
+        _frontmatter_cache = {}
+
+
+def save_cache(cache_path: str) -> None:
+    """Save the parsed frontmatter for the source files read in this build."""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f'{cache_path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(_frontmatter_used, f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+
+
+class _SourceFiles(NamedTuple):
+    """The files in a site source, found in one walk of the source tree."""
+
+    pages: List[str]
+    static: List[Tuple[str, str]]
+    templates: List[Tuple[str, str]]
+
+
+_unclaimed: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+"""
+Static and template paths found by :func:`load_pages` but not yet used.
+
+These are keyed on the source path and the kind of file ('static' or
+'templates'). They are only kept once all of the pages have been loaded, and
+are used at most once, by the next call to :func:`load_static_paths` or
+:func:`load_template_paths`; otherwise, those walk the source again.
+"""
+
+
+def _scan_source(source_path: str) -> _SourceFiles:
+    """Find the pages, static files, and templates in the site source."""
+    files = _SourceFiles([], [], [])
+    offset = len(source_path) + 1
+    templates_dir = '_templates/'
+    for dirpath, entry in walk_files(source_path):
+        rel_path = entry.path[offset:]
+        if entry.name.endswith('.md'):
+            files.pages.append(rel_path[:-3])
+        elif entry.name.startswith('.'):
+            continue
+        # Top-level directories like _templates aren't static.
+        elif not (rel_path.startswith('_') and '/' in rel_path):
+            files.static.append((rel_path, entry.path))
+        elif rel_path.startswith(templates_dir) \
+                and entry.name.endswith('.html'):
+            files.templates.append((rel_path[len(templates_dir):],
+                                    entry.path))
+    return files
+
+
+def _claim(source_path: str, kind: str) -> List[Tuple[str, str]]:
+    paths = _unclaimed.pop((source_path, kind), None)
+    if paths is None:
+        paths = getattr(_scan_source(source_path), kind)
+    return paths
 
 
-def load_static_paths() -> List[Tuple[str, str]]:
+def load_pages(threaded: bool = True) -> Iterable[SourcePage]:
+    """
+    (Lazily) load all pages in the site source.
+
+    Pages are loaded by a few threads, so that reading from the filesystem
+    overlaps with whatever the caller is doing with the pages. They are
+    still yielded in the order that they are found. Only a few pages are
+    loaded ahead of the caller at any one time, so they aren't all held in
+    memory at once.
+
+    The static files and templates are found in the same walk over the
+    source. Once all of the pages have been loaded, they are kept for the
+    next call to :func:`load_static_paths` and :func:`load_template_paths`.
+
+    Parameters
+    ----------
+    threaded : bool
+        If False, pages are loaded one at a time as they are needed. Use this
+        if the caller forks processes while it consumes the pages (e.g. a
+        :class:`.ProcessPoolExecutor`), since forking while other threads
+        are running can leave the child deadlocked.
+
+    """
+    source_path = get_source_path()
+    files = _scan_source(source_path)
+    _unclaimed.pop((source_path, 'static'), None)
+    _unclaimed.pop((source_path, 'templates'), None)
+    if threaded:
+        yield from _load_in_threads(source_path, files.pages)
+    else:
+        for page_path in files.pages:
+            yield load_page(source_path, page_path)
+    # This is only reached if all of the pages were loaded, so an aborted
+    # build doesn't leave a listing behind.
+    _unclaimed[(source_path, 'static')] = files.static
+    _unclaimed[(source_path, 'templates')] = files.templates
+
+
+def _load_in_threads(source_path: str, page_paths: List[str]) \
+        -> Iterable[SourcePage]:
+    # Make sure that the threads don't all go off and read the git log.
+    _get_commit_index(source_path)
+    # Unlike Executor.map, this doesn't submit all of the pages up front.
+    with ThreadPoolExecutor(max_workers=LOAD_WORKERS) as executor:
+        pending: Deque[Future] = deque()
+        for page_path in page_paths:
+            pending.append(executor.submit(load_page, source_path, page_path))
+            if len(pending) >= 2 * LOAD_WORKERS:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def load_static_paths() -> Iterable[Tuple[str, str]]:
     """
-    Get all of the paths to static files in the site source.
+    (Lazily) get all of the paths to static files in the site source.
 
     Returns
     -------
-    list
-        Items are Tuple[str, str], where the first element is the relative
+    generator
+        Yields Tuple[str, str], where the first element is the relative
         path (key) for the static file, and the second element is the absolute
         path to the static file in the site source.
 
     """
-    source_path = get_source_path()
-    files = []
-    for dirpath, dirnames, filenames in os.walk(source_path):
-        rdir = os.path.abspath(dirpath).split(source_path, 1)[1].lstrip('/')
-        if rdir.startswith('_'):
-            continue
-
-        for filename in filenames:
-            if filename.endswith('.md') or filename.startswith('.'):
-                continue
-            content_path = os.path.join(dirpath, filename)
-            page_path = content_path[len(source_path):].strip('/')
-            files.append((page_path, content_path))
-    return files
+    yield from _claim(get_source_path(), 'static')
 
 
-def load_template_paths() -> List[Tuple[str, str]]:
+def load_template_paths() -> Iterable[Tuple[str, str]]:
     """
-    Get all of the paths to templates in the site source.
+    (Lazily) get all of the paths to templates in the site source.
 
     Returns
     -------
-    list
-        Items are Tuple[str, str], where the first element is the relative
+    generator
+        Yields Tuple[str, str], where the first element is the relative
         path (key) for the template, and the second element is the absolute
         path to the template file in the site source.
 
     """
-    templates_path = get_templates_path()
-    if not os.path.exists(templates_path):
-        return []
-    files = []
-    for dirpath, dirnames, filenames in os.walk(templates_path):
-        for filename in filenames:
-            if not filename.endswith('.html') or filename.startswith('.'):
-                continue
-            content_path = os.path.join(dirpath, filename)
-            template_path = content_path[len(templates_path):].strip('/')
-            files.append((template_path, content_path))
-    return files
+    yield from _claim(get_source_path(), 'templates')
 
 
 def _get_title(page_data: dict, page_path: str) -> str:
     """Get the title of a source page."""
     title = page_data.get('title')
     if title is None:
-        for line in page_data.content.split('\n'):
+        # The title is usually on the first line, so we read lines as we go
+        # rather than splitting up the whole page.
+        for line in io.StringIO(page_data.content):
             cleaned = line.replace('#', '').strip()
             if cleaned:
                 title = cleaned
@@ -56,3 +56,28 @@ class TestSiteTree(TestCase):
                 }
             }
         )
+
+
+class TestLoadPage(TestCase):
+    """Tests loading built pages."""
+
+    @mock.patch(f'{site.__name__}.config', CONFIG)
+    def test_load_page(self):
+        """Load a page that exists."""
+        page = site.load_page('foo')
+        self.assertEqual(page.page_path, 'foo')
+        self.assertEqual(page.metadata['title'], 'Another foo page')
+
+    @mock.patch(f'{site.__name__}.config', CONFIG)
+    def test_load_index_page(self):
+        """Load a directory that has an index page."""
+        page = site.load_page('baz')
+        self.assertEqual(page.page_path, 'baz/index')
+        self.assertEqual(page.metadata['title'], 'Baz Page')
+
+    @mock.patch(f'{site.__name__}.config', CONFIG)
+    def test_load_nonexistant_page(self):
+        """Load a page that does not exist."""
+        with self.assertRaises(site.PageNotFound):
+            site.load_page('nope')
+        self.assertEqual(site.load_metadata('nope'), {})
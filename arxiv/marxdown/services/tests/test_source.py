@@ -7,61 +7,16 @@ import tempfile
 from datetime import datetime
 from pytz import UTC
 import time
-import git
+
+import pytest
 
 from .. import source
 
 
+@pytest.mark.usefixtures('site_source_class')
 class TestLoadSource(TestCase):
     """Test loading a site source."""
 
-    CONTENT = [
-        ('index.md', '# This is the index\n\nHere is <a href="foo">link</a>.'),
-        ('foo.md', '# Another foo page\n\nSee also <a href="baz">baz</a>.'),
-        ('baz/index.md', '---\ntitle: Baz Page\n---\n# The baz index page'),
-        ('baz/redirectme.md', '---\nresponse:\n  status: 301\n  location: ../foo\n---'),
-        ('baz/deleted.md', '---\nresponse:\n  deleted: true\n---\nNot here'),
-        ('notapage.txt', 'some non-markdown content here'),
-        ('baz/foo.dat', 'some more non-markdown content here'),
-        ('_hidden/baz.dat', 'this is not here'),
-        ('_templates/sometemplate.html', '<html><body>what</body></html>'),
-        ('_templates/notatemplate.txt', 'nope'),
-    ]
-
-    @classmethod
-    def setUpClass(cls):
-        """Create a minimal site source in a Git repository."""
-        cls.site_dir = "test"
-        cls.repo_path = tempfile.mkdtemp()
-        cls.source_path = os.path.join(cls.repo_path, cls.site_dir)
-        cls.repo = git.Repo.init(cls.repo_path)
-        cls.repo_name = 'arxiv/foo'
-        cls.repo.create_remote('origin', f'git@github.com:{cls.repo_name}.git')
-        cls.created = {}
-
-        # Add and commit files to the repo.
-        for path, content in cls.CONTENT:
-            fpath = os.path.join(cls.source_path, path)
-            parent, _ = os.path.split(fpath)
-            if not os.path.exists(parent):
-                os.makedirs(parent)
-            with open(fpath, 'w') as f:
-                f.write(content)
-            cls.repo.index.add([fpath])
-            commit = cls.repo.index.commit("added %s" % path)
-            created = datetime.utcfromtimestamp(commit.committed_date)
-            cls.created[path] = created.replace(tzinfo=UTC)
-            time.sleep(0.25)   # So that the creation times might vary.
-        cls.branch = cls.repo.create_head('new')
-        cls.repo.head.reference = cls.branch
-        cls.version = '0.4.5'
-        cls.latest_tag = cls.repo.create_tag(cls.version, message='message!')
-
-    @classmethod
-    def tearDownClass(cls):
-        """Clean up."""
-        shutil.rmtree(cls.repo_path)
-
     @classmethod
     def mock_configure(cls, mock_config):
         """Configure the source module."""
@@ -95,6 +50,31 @@ class TestLoadSource(TestCase):
         self.assertTrue(source.page_exists(self.source_path, 'foo'))
         self.assertTrue(source.page_exists(self.source_path, 'baz/index'))
         self.assertFalse(source.page_exists(self.source_path, 'baz/bar'))
+        self.assertFalse(source.page_exists(self.source_path, 'nope/index'))
+
+    @mock.patch(f'{source.__name__}.config')
+    def test_get_commit_index(self, mock_config):
+        """Test :func:`source._get_commit_index`."""
+        self.mock_configure(mock_config)
+        commits = source._get_commit_index(self.source_path)
+        self.assertEqual(len(commits), len(self.CONTENT))
+        commit, = commits[f'{self.site_dir}/baz/index.md']
+        self.assertEqual(commit.message, 'added baz/index.md')
+        self.assertEqual(
+            datetime.utcfromtimestamp(commit.committed_date)
+            .replace(tzinfo=UTC),
+            self.created['baz/index.md']
+        )
+
+    @mock.patch(f'{source.__name__}.get_repo_path')
+    @mock.patch(f'{source.__name__}.subprocess.run')
+    def test_get_commit_index_fails(self, mock_run, mock_get_repo_path):
+        """The build stops if the commit log can't be read."""
+        mock_get_repo_path.return_value = self.repo_path
+        mock_run.return_value = mock.MagicMock(returncode=128, stdout=b'',
+                                               stderr=b'fatal: nope')
+        with self.assertRaisesRegex(RuntimeError, 'fatal: nope'):
+            source._get_commit_index.__wrapped__(self.source_path)
 
     @mock.patch(f'{source.__name__}.config')
     def test_load_page(self, mock_config):
@@ -166,11 +146,24 @@ class TestLoadSource(TestCase):
         for page in pages:
             self.assertIsInstance(page, source.SourcePage)
 
+    @mock.patch(f'{source.__name__}.LOAD_WORKERS', 1)
+    @mock.patch(f'{source.__name__}.config')
+    def test_load_pages_lazily(self, mock_config):
+        """Pages are only loaded a little ahead of the caller."""
+        self.mock_configure(mock_config)
+        for threaded, ahead in [(True, 2), (False, 1)]:
+            with mock.patch.object(source, 'load_page',
+                                   wraps=source.load_page) as load_page:
+                pages = source.load_pages(threaded=threaded)
+                next(pages)
+                pages.close()
+            self.assertLessEqual(load_page.call_count, ahead)
+
     @mock.patch(f'{source.__name__}.config')
     def test_load_static_paths(self, mock_config):
         """Load paths for all the static files."""
         self.mock_configure(mock_config)
-        paths = source.load_static_paths()
+        paths = list(source.load_static_paths())
         self.assertEqual(len(paths), 2)
         self.assertEqual(paths[0][0], 'notapage.txt')
         self.assertTrue(paths[0][1].endswith(f'{self.site_dir}/notapage.txt'))
@@ -182,7 +175,7 @@ class TestLoadSource(TestCase):
     def test_load_template_paths(self, mock_config):
         """Load paths for all the templates."""
         self.mock_configure(mock_config)
-        paths = source.load_template_paths()
+        paths = list(source.load_template_paths())
         self.assertEqual(len(paths), 1)
         self.assertEqual(paths[0][0], 'sometemplate.html')
         self.assertTrue(
@@ -190,3 +183,120 @@ class TestLoadSource(TestCase):
                 f'{self.site_dir}/_templates/sometemplate.html'
             )
         )
+
+    @mock.patch(f'{source.__name__}.config')
+    def test_load_all_in_one_walk(self, mock_config):
+        """Static and template paths are found while loading the pages."""
+        self.mock_configure(mock_config)
+        with mock.patch.object(source, '_scan_source',
+                               wraps=source._scan_source) as scan:
+            list(source.load_pages())
+            static = list(source.load_static_paths())
+            templates = list(source.load_template_paths())
+            self.assertEqual(scan.call_count, 1,
+                             'The source is walked only once')
+            self.assertEqual(len(static), 2)
+            self.assertEqual(len(templates), 1)
+
+            self.assertEqual(list(source.load_static_paths()), static,
+                             'The source is walked again next time')
+            self.assertEqual(scan.call_count, 2)
+
+            pages = source.load_pages()
+            next(pages)
+            pages.close()
+            list(source.load_static_paths())
+            self.assertEqual(scan.call_count, 4,
+                             'Nothing is kept if loading pages is aborted')
+
+    @mock.patch(f'{source.__name__}.config')
+    def test_load_missing_source(self, mock_config):
+        """A source path that doesn't exist has nothing in it."""
+        mock_config.return_value = {
+            'SOURCE_PATH': os.path.join(self.source_path, 'nope')
+        }
+        self.assertEqual(list(source.load_static_paths()), [])
+        self.assertEqual(list(source.load_template_paths()), [])
+
+
+class TestSourceCache(TestCase):
+    """Test reusing parsed source from a previous build."""
+
+    def setUp(self):
+        """Create a source file that was last modified a while ago."""
+        self.tmp_path = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.tmp_path, 'build', '.cache')
+        self.page_path = os.path.join(self.tmp_path, 'page.md')
+        with open(self.page_path, 'w') as f:
+            f.write('---\ntitle: Cached\n---\nSome content')
+        an_hour_ago = time.time() - 3600
+        os.utime(self.page_path, (an_hour_ago, an_hour_ago))
+
+    def tearDown(self):
+        """Clean up."""
+        shutil.rmtree(self.tmp_path)
+
+    def test_unchanged_file(self):
+        """The file has not changed since the cache was saved."""
+        source._load_frontmatter(self.page_path)
+        source.save_cache(self.cache_path)
+        source.load_cache(self.cache_path)
+        with mock.patch(f'{source.__name__}.frontmatter.loads') as mock_load:
+            page_data = source._load_frontmatter(self.page_path)
+        self.assertEqual(mock_load.call_count, 0)
+        self.assertEqual(page_data.get('title'), 'Cached')
+        self.assertEqual(page_data.content, 'Some content')
+
+    def test_changed_file(self):
+        """The file has changed since the cache was saved."""
+        source._load_frontmatter(self.page_path)
+        source.save_cache(self.cache_path)
+        source.load_cache(self.cache_path)
+        with open(self.page_path, 'w') as f:
+            f.write('---\ntitle: Changed\n---\nSome new content')
+        page_data = source._load_frontmatter(self.page_path)
+        self.assertEqual(page_data.get('title'), 'Changed')
+        self.assertEqual(page_data.content, 'Some new content')
+
+    def test_new_build(self):
+        """Files read for an earlier build aren't saved with the next one."""
+        source._load_frontmatter(self.page_path)
+        source.save_cache(self.cache_path)
+        other_cache_path = os.path.join(self.tmp_path, 'other', '.cache')
+        source.load_cache(other_cache_path)
+        source.save_cache(other_cache_path)
+        source.load_cache(other_cache_path)
+        with mock.patch(f'{source.__name__}.frontmatter.loads',
+                        wraps=source.frontmatter.loads) as mock_load:
+            source._load_frontmatter(self.page_path)
+        self.assertEqual(mock_load.call_count, 1)
+
+    def test_bad_cache(self):
+        """The cache file is not readable."""
+        os.makedirs(os.path.dirname(self.cache_path))
+        with open(self.cache_path, 'w') as f:
+            f.write('not a pickle')
+        source.load_cache(self.cache_path)
+        page_data = source._load_frontmatter(self.page_path)
+        self.assertEqual(page_data.get('title'), 'Cached')
+
+
+class TestGitRef(TestCase):
+    """Test getting the repository name from a remote URL."""
+
+    def test_remote_urls(self):
+        """Both SSH and HTTPS GitHub remotes are supported."""
+        for url in ['git@github.com:arxiv/foo.git',
+                    'https://github.com/arxiv/foo.git',
+                    'https://github.com/arxiv/foo',
+                    'https://github.com/arxiv/foo/']:
+            self.assertEqual(source.GIT_REF.fullmatch(url).group(1),
+                             'arxiv/foo')
+        self.assertEqual(
+            source.GIT_REF.fullmatch('git@github.com:arxiv/foo.io.git')
+            .group(1),
+            'arxiv/foo.io'
+        )
+        self.assertIsNone(
+            source.GIT_REF.fullmatch('git@gitlab.com:arxiv/foo.git')
+        )
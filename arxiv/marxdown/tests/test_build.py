@@ -1,70 +1,26 @@
 """Tests for :mod:`.build`."""
 
 from unittest import TestCase, mock
+from typing import Dict
 import os
 import shutil
 import tempfile
-from datetime import datetime
-from pytz import UTC
-import time
-import git
+
+import pytest
 
 from ..services import source, index, site
 from .. import build
 
 
-class TestBuild(TestCase):
-    """Test building a site from source."""
+@pytest.fixture(scope='class')
+def build_dir_class(request, tmp_path_factory) -> None:
+    """Create a directory into which to build the site."""
+    request.cls.build_dir = str(tmp_path_factory.mktemp('build'))
 
-    CONTENT = [
-        ('index.md', '# This is the index\n\nHere is <a href="foo">link</a>.'),
-        ('foo.md', '# Another foo page\n\nSee also <a href="baz">baz</a>.'),
-        ('baz/index.md', '---\ntitle: Baz Page\n---\n# The baz index page'),
-        ('notapage.txt', 'some non-markdown content here'),
-        ('baz/foo.dat', 'some more non-markdown content here'),
-        ('baz/redirectme.md',
-         '---\nresponse:\n  status: 301\n  location: ../foo\n---'),
-        ('baz/deleted.md', '---\nresponse:\n  deleted: true\n---\nNot here'),
-        ('_hidden/baz.dat', 'this is not here'),
-        ('_templates/sometemplate.html', '<html><body>what</body></html>'),
-        ('_templates/notatemplate.txt', 'nope'),
-    ]
 
-    @classmethod
-    def setUpClass(cls):
-        """Create a minimal site source in a Git repository."""
-        cls.build_dir = tempfile.mkdtemp()
-        cls.site_dir = "test"
-        cls.repo_path = tempfile.mkdtemp()
-        cls.source_path = os.path.join(cls.repo_path, cls.site_dir)
-        cls.repo = git.Repo.init(cls.repo_path)
-        cls.repo_name = 'arxiv/foo'
-        cls.repo.create_remote('origin', f'git@github.com:{cls.repo_name}.git')
-        cls.created = {}
-
-        # Add and commit files to the repo.
-        for path, content in cls.CONTENT:
-            fpath = os.path.join(cls.source_path, path)
-            parent, _ = os.path.split(fpath)
-            if not os.path.exists(parent):
-                os.makedirs(parent)
-            with open(fpath, 'w') as f:
-                f.write(content)
-            cls.repo.index.add([fpath])
-            commit = cls.repo.index.commit("added %s" % path)
-            created = datetime.utcfromtimestamp(commit.committed_date)
-            cls.created[path] = created.replace(tzinfo=UTC)
-            time.sleep(0.25)   # So that the creation times might vary.
-        cls.branch = cls.repo.create_head('new')
-        cls.repo.head.reference = cls.branch
-        cls.version = '0.4.5'
-        cls.latest_tag = cls.repo.create_tag(cls.version, message='message!')
-
-    @classmethod
-    def tearDownClass(cls):
-        """Clean up."""
-        shutil.rmtree(cls.build_dir)
-        shutil.rmtree(cls.repo_path)
+@pytest.mark.usefixtures('site_source_class', 'build_dir_class')
+class TestBuild(TestCase):
+    """Test building a site from source."""
 
     @classmethod
     def mock_configure(cls, mock_config):
@@ -88,43 +44,74 @@ class TestBuild(TestCase):
         build._build_site()
 
         index_path = os.path.join(self.build_dir, 'idx')
+        built = {
+            os.path.relpath(os.path.join(parent, fname), self.build_dir)
+            for parent, _, fnames in os.walk(self.build_dir)
+            for fname in fnames
+        }
 
         # Data object is created for each page.
-        data_path = os.path.join(self.build_dir, 'data')
-        self.assertTrue(os.path.exists(data_path))
-        self.assertTrue(os.path.exists(os.path.join(data_path, 'index.json')))
-        self.assertTrue(os.path.exists(os.path.join(data_path, 'foo.json')))
-        self.assertTrue(
-            os.path.exists(os.path.join(data_path, 'baz/index.json')))
-        self.assertTrue(
-            os.path.exists(os.path.join(data_path, 'baz/redirectme.json')))
-        self.assertTrue(
-            os.path.exists(os.path.join(data_path, 'baz/deleted.json')))
+        self.assertIn('data/index.json', built)
+        self.assertIn('data/foo.json', built)
+        self.assertIn('data/baz/index.json', built)
+        self.assertIn('data/baz/redirectme.json', built)
+        self.assertIn('data/baz/deleted.json', built)
 
         # Template fragment is created for each page.
-        pages_path = os.path.join(self.build_dir, 'pages')
-        self.assertTrue(os.path.exists(pages_path))
-        self.assertTrue(os.path.exists(os.path.join(pages_path, 'index.j2')))
-        self.assertTrue(os.path.exists(os.path.join(pages_path, 'foo.j2')))
-        self.assertTrue(
-            os.path.exists(os.path.join(pages_path, 'baz/index.j2')))
-        self.assertTrue(
-            os.path.exists(os.path.join(pages_path, 'baz/redirectme.j2')))
-        self.assertTrue(
-            os.path.exists(os.path.join(pages_path, 'baz/deleted.j2')))
+        self.assertIn('pages/index.j2', built)
+        self.assertIn('pages/foo.j2', built)
+        self.assertIn('pages/baz/index.j2', built)
+        self.assertIn('pages/baz/redirectme.j2', built)
+        self.assertIn('pages/baz/deleted.j2', built)
 
         # Templates are copied in.
-        templates_path = os.path.join(self.build_dir, 'templates')
-        self.assertTrue(os.path.exists(templates_path))
-        self.assertTrue(
-            os.path.exists(os.path.join(templates_path, 'sometemplate.html')))
+        self.assertIn('templates/sometemplate.html', built)
 
         # Static files are copied in.
-        static_path = os.path.join(self.build_dir, 'static', self.site_dir)
-        self.assertTrue(os.path.exists(static_path))
-        self.assertTrue(
-            os.path.exists(os.path.join(static_path, 'notapage.txt')))
-        self.assertTrue(
-            os.path.exists(os.path.join(static_path, 'baz/foo.dat')))
+        self.assertIn(f'static/{self.site_dir}/notapage.txt', built)
+        self.assertIn(f'static/{self.site_dir}/baz/foo.dat', built)
 
         self.assertTrue(os.path.exists(index_path))
+        self.assertEqual(index.find('foo').results[0].page_path, 'foo',
+                         'Pages are added to the search index')
+
+    def _build_into(self, build_dir: str, parallel: bool) -> Dict[str, str]:
+        """Build the site into ``build_dir``, and get the pages and data."""
+        config = mock.MagicMock(return_value={
+            'SOURCE_PATH': self.source_path,
+            'BUILD_PATH': build_dir,
+            'SITE_NAME': 'test',
+            'SITE_HUMAN_NAME': 'The test site of testiness',
+            'SITE_HUMAN_SHORT_NAME': 'Test site',
+            'SITE_SEARCH_ENABLED': 1,
+        })
+        with mock.patch(f'{site.__name__}.config', config), \
+                mock.patch(f'{index.__name__}.config', config), \
+                mock.patch(f'{source.__name__}.config', config):
+            build._build_site(parallel=parallel)
+
+        built = {}
+        for subdir in ['pages', 'data', 'static', 'templates']:
+            for parent, _, fnames in os.walk(os.path.join(build_dir, subdir)):
+                for fname in fnames:
+                    path = os.path.join(parent, fname)
+                    with open(path) as f:
+                        built[os.path.relpath(path, build_dir)] = f.read()
+        return built
+
+    def test_build_site_in_parallel(self):
+        """Build the site, rendering pages in worker processes."""
+        serial_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, serial_dir)
+        parallel_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, parallel_dir)
+
+        # Also check that we cope with not knowing how many CPUs there are.
+        with mock.patch(f'{build.__name__}.os.cpu_count', return_value=None):
+            built = self._build_into(parallel_dir, parallel=True)
+        for page_path in ['index', 'foo', 'baz/index', 'baz/redirectme',
+                          'baz/deleted']:
+            self.assertIn(f'pages/{page_path}.j2', built)
+            self.assertIn(f'data/{page_path}.json', built)
+        self.assertEqual(built, self._build_into(serial_dir, parallel=False),
+                         'The parallel build is the same as the serial one')
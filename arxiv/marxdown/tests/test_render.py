@@ -2,6 +2,8 @@ from unittest import TestCase, mock
 import re
 from .. import render
 
+WHITESPACE = re.compile(r"\s+")
+
 
 class TestMailToLinks(TestCase):
     """Link processing should not break ``mailto:`` links."""
@@ -45,8 +47,8 @@ class TestEscapeBrackets(TestCase):
              {{ '}' }}
             ```
             </pre></div>"""
-        self.assertEqual(re.sub(r"\s+", "", render.render(raw)),
-                         re.sub(r"\s+", "", expected),
+        self.assertEqual(WHITESPACE.sub("", render.render(raw)),
+                         WHITESPACE.sub("", expected),
                          "Braces in the BibTeX are replaced")
 
     def test_dont_escape_jinja(self):
@@ -63,3 +65,108 @@ class TestEscapeBrackets(TestCase):
         dereferencer = render.get_deferencer(mock.MagicMock(), "name")
         self.assertEqual(render.render(raw, dereferencer), expected,
                          "Injected url_for tags are not escaped")
+
+    def test_dont_escape_images(self):
+        """Jinja for static URL generation should not be escaped."""
+        raw = """here is ![an image](img/foo.png)."""
+        expected = """<p>here is <img alt="an image" src="{{ url_for('name.static', filename='img/foo.png') }}" />.</p>"""
+        dereferencer = render.get_deferencer(mock.MagicMock(), "name")
+        self.assertEqual(render.render(raw, dereferencer), expected,
+                         "Injected url_for tags are not escaped")
+
+
+class TestReuseMarkdown(TestCase):
+    """The markdown processor is reused across calls to ``render``."""
+
+    def test_render_is_repeatable(self):
+        """State from one page should not leak into the next."""
+        raw = """# A heading\n\nSee [here](to/somewhere.md)."""
+        dereferencer = render.get_deferencer(mock.MagicMock(), "name")
+        first = render.render(raw, dereferencer)
+        self.assertEqual(render.render(raw, dereferencer), first,
+                         "Rendering the same content yields the same HTML")
+        self.assertIn('<h1 id="a-heading">', first,
+                      "Heading IDs do not accumulate suffixes")
+        self.assertIn('<a href="to/somewhere.md">', render.render(raw),
+                      "Dereferencer is not retained between calls")
+
+
+class TestStyleClasses(TestCase):
+    """CSS classes are added to elements wherever they occur."""
+
+    def test_nested_table(self):
+        """Tables that are not direct children of the root get classes."""
+        raw = """> | a | b |\n> |---|---|\n> | 1 | 2 |\n"""
+        self.assertIn('<table class="table is-striped">', render.render(raw))
+
+
+class TestLinker(TestCase):
+    """Tests for :func:`render.get_linker`."""
+
+    def setUp(self):
+        """Get a linker for a page in a subdirectory."""
+        self.linker = render.get_linker(mock.MagicMock(page_path='baz/foo'),
+                                        'name')
+
+    def test_not_ours(self):
+        """External, absolute, anchor, and mailto links are untouched."""
+        for href in ['https://arxiv.org', '/abs', '#top', 'mailto:a@b.c',
+                     'foo?next=http://bar', '']:
+            self.assertEqual(self.linker(href), (href, None, None, None))
+
+    def test_pages(self):
+        """Links to markdown sources and extensionless paths are pages."""
+        self.assertEqual(self.linker('bat.md'),
+                         ('name.from_sitemap', 'page_path', 'baz/bat', None))
+        self.assertEqual(self.linker('v1.2/bat#sec'),
+                         ('name.from_sitemap', 'page_path', 'baz/v1.2/bat',
+                          'sec'))
+
+    def test_static(self):
+        """Links with other extensions are static files."""
+        self.assertEqual(self.linker('img/bat.png'),
+                         ('name.static', 'filename', 'baz/img/bat.png', None))
+
+
+class TestRenderWithText(TestCase):
+    """Plain text is extracted while rendering, e.g. for indexing."""
+
+    def test_text(self):
+        """Markup, including raw HTML, is stripped from the text."""
+        raw = """# A heading\n\nHere is <a href="foo">a link</a> & {braces}."""
+        rendered, text = render.render_with_text(raw)
+        self.assertEqual(rendered, render.render(raw))
+        self.assertEqual(text.split(), ['A', 'heading', 'Here', 'is', 'a',
+                                        'link', '&', '{braces}.'])
+
+    def test_raw_html_block(self):
+        """Text in raw HTML blocks is included."""
+        raw = """<div class="note"><p>Block &amp; html</p></div>"""
+        _, text = render.render_with_text(raw)
+        self.assertEqual(text.strip(), 'Block & html')
+
+    def test_empty(self):
+        """A page with no content (e.g. a redirect) has no text."""
+        render.render_with_text('# A heading\n\nsome body text')
+        for raw in ['', '\n  \n']:
+            _, text = render.render_with_text(raw)
+            self.assertEqual(text, '', 'Text from the last page is not kept')
+
+
+class TestDereferencer(TestCase):
+    """Tests for :func:`render.get_deferencer`."""
+
+    def test_shared_within_directory(self):
+        """Pages in the same directory share a dereferencer."""
+        deref = render.get_deferencer(mock.MagicMock(page_path='baz/foo'), 'n')
+        self.assertIs(
+            render.get_deferencer(mock.MagicMock(page_path='baz/bar'), 'n'),
+            deref
+        )
+        self.assertIsNot(
+            render.get_deferencer(mock.MagicMock(page_path='bat/bar'), 'n'),
+            deref
+        )
+        self.assertEqual(deref('../index.md'),
+                         "$jinja {{ url_for('n.from_sitemap',"
+                         " page_path='baz/../index') }} jinja$")
@@ -10,7 +10,7 @@ import time
 import git
 import copy
 from arxiv import status
-from .. import factory
+from .. import factory, routes
 
 BUILD_DIR = os.path.join(os.path.split(os.path.abspath(__file__))[0], 'data')
 S3_BUCKET = 'test-bucket'
@@ -32,17 +32,51 @@ CONFIG_WITH_CDN = copy.copy(CONFIG)
 CONFIG_WITH_CDN.FLASKS3_CDN_DOMAIN = CDN
 
 
-class TestServeSite(TestCase):
+class ServeSiteMixin:
+    """
+    Creates the app for a test class, and checks static files with it.
+
+    Test classes set :attr:`.CONFIG`, and :attr:`.STATIC_HOST` for the host
+    that static files are expected to be served from.
+    """
+
+    CONFIG: mock.MagicMock
+    STATIC_HOST: str
+
+    @classmethod
+    def setUpClass(cls):
+        """
+        Create the app once for all of the tests.
+
+        The config is only read when the app is created.
+        """
+        with mock.patch(f'{factory.__name__}.config', cls.CONFIG):
+            cls.app = factory.create_web_app()
+        cls.client = cls.app.test_client()
+
+    def test_serve_static(self):
+        """Requests for static URLs should be redirected."""
+        with self.app.app_context():
+            response = self.client.head('/notapage.txt',
+                                        follow_redirects=False)
+            self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+            self.assertEqual(
+                response.headers['Location'],
+                "https://%s/static/arxiv.marxdown/%s/%s/%s"
+                % (self.STATIC_HOST, VERSION, SITE_NAME, "notapage.txt")
+            )
+
+
+class TestServeSite(ServeSiteMixin, TestCase):
     """Serve the build site."""
 
-    @mock.patch(f'{factory.__name__}.config', CONFIG)
+    CONFIG = CONFIG
+    STATIC_HOST = f'{S3_BUCKET}.s3.amazonaws.com'
+
     def test_serve(self):
         """Test the site."""
-        app = factory.create_web_app()
-        client = app.test_client()
-
-        with app.app_context():
-            response = client.get('/')
+        with self.app.app_context():
+            response = self.client.get('/')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertIn(b'<title>This is the index', response.data)
             self.assertIn(b'<h1 id="this-is-the-index">This is the index</h1>',
@@ -50,7 +84,7 @@ class TestServeSite(TestCase):
             self.assertIn(b'<p>Here is <a href="foo">link</a>.</p>',
                           response.data)
 
-            response = client.get('/foo')
+            response = self.client.get('/foo')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertIn(b'<title>Another foo page', response.data)
             self.assertIn(b'<h1 id="another-foo-page">Another foo page</h1>',
@@ -58,7 +92,7 @@ class TestServeSite(TestCase):
             self.assertIn(b'<p>See also <a href="baz">baz</a>.</p>',
                           response.data)
 
-            response = client.get('/baz')
+            response = self.client.get('/baz')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertIn(b'<title>Baz Page', response.data)
             self.assertIn(
@@ -66,177 +100,102 @@ class TestServeSite(TestCase):
                 response.data
             )
 
-            response = client.get('/nope')
+            response = self.client.get('/nope')
             self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
-    @mock.patch(f'{factory.__name__}.config', CONFIG)
+    def test_serve_twice(self):
+        """Compiled pages are reused across requests."""
+        with self.app.app_context():
+            first = self.client.get('/foo')
+            hits = routes._compile_page.cache_info().hits
+            second = self.client.get('/foo')
+            self.assertEqual(first.data, second.data)
+            self.assertEqual(routes._compile_page.cache_info().hits, hits + 1)
+
     def test_search(self):
         """Test the search page."""
-        app = factory.create_web_app()
-        client = app.test_client()
-
-        with app.app_context():
-            response = client.get('/search')
+        with self.app.app_context():
+            response = self.client.get('/search')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-            response = client.get('/search?q=foo')
+            response = self.client.get('/search?q=foo')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertIn(b'<a href="/foo">Another foo page</a>',
                           response.data)
 
-            response = client.get('/search?q=index')
+            response = self.client.get('/search?q=index')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertIn(b'<a href="/">This is the index</a>', response.data)
 
-            response = client.get('/search?q=baz')
+            response = self.client.get('/search?q=baz')
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertIn(b'<a href="/baz">Baz Page</a>', response.data)
 
-    @mock.patch(f'{factory.__name__}.config', CONFIG)
     def test_redirect(self):
         """Test redirection based on frontmatter."""
-        app = factory.create_web_app()
-        client = app.test_client()
-
-        with app.app_context():
-            response = client.get('/baz/redirectme', follow_redirects=False)
+        with self.app.app_context():
+            response = self.client.head('/baz/redirectme',
+                                        follow_redirects=False)
             self.assertEqual(response.status_code,
                              status.HTTP_301_MOVED_PERMANENTLY)
             self.assertEqual(response.headers['Location'],
                              'http://localhost/foo')
 
-    @mock.patch(f'{factory.__name__}.config', CONFIG)
     def test_deleted(self):
         """Test redirection based on frontmatter."""
-        app = factory.create_web_app()
-        client = app.test_client()
-
-        with app.app_context():
-            response = client.get('/baz/deleted', follow_redirects=False)
+        with self.app.app_context():
+            response = self.client.get('/baz/deleted', follow_redirects=False)
             self.assertEqual(response.status_code,
                              status.HTTP_404_NOT_FOUND)
             self.assertIn(b'Not here', response.data)
 
-    @mock.patch(f'{factory.__name__}.config', CONFIG)
     def test_serve_with_html(self):
         """Legacy URLs that end in .html should be handled gracefully."""
-        app = factory.create_web_app()
-        client = app.test_client()
-
-        with app.app_context():
-            response = client.get('/index.html', follow_redirects=True)
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertIn(b'<title>This is the index', response.data)
-            self.assertIn(b'<h1 id="this-is-the-index">This is the index</h1>',
-                          response.data)
-            self.assertIn(b'<p>Here is <a href="foo">link</a>.</p>',
-                          response.data)
+        self._check_legacy_suffix('.html')
 
-            response = client.get('/foo.html', follow_redirects=True)
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertIn(b'<title>Another foo page', response.data)
-            self.assertIn(b'<h1 id="another-foo-page">Another foo page</h1>',
-                          response.data)
-            self.assertIn(b'<p>See also <a href="baz">baz</a>.</p>',
-                          response.data)
+    def test_serve_with_htm(self):
+        """Legacy URLs that end in .htm should be handled gracefully."""
+        self._check_legacy_suffix('.htm')
 
-            response = client.get('/baz.html', follow_redirects=True)
+    def _check_legacy_suffix(self, suffix: str) -> None:
+        """Legacy URLs with ``suffix`` redirect to their bare equivalents."""
+        with self.app.app_context():
+            response = self.client.get(f'/index{suffix}',
+                                       follow_redirects=True)
             self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertIn(b'<title>Baz Page', response.data)
-            self.assertIn(
-                b'<h1 id="the-baz-index-page">The baz index page</h1>',
-                response.data
-            )
-
-            response = client.get('/nope.html', follow_redirects=True)
-            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+            self.assertIn(b'<title>This is the index', response.data)
 
-            response = client.get('/baz/deleted.html', follow_redirects=True)
+            # The first hop is the same for all of these, so we only look at
+            # the headers.
+            for page_path in ['foo', 'baz', 'baz/deleted', 'baz/redirectme']:
+                response = self.client.head(f'/{page_path}{suffix}',
+                                            follow_redirects=False)
+                self.assertEqual(response.status_code,
+                                 status.HTTP_302_FOUND)
+                self.assertEqual(response.headers['Location'],
+                                 f'http://localhost/{page_path}')
+
+            # Pages that are deleted or redirected still end up in the right
+            # place.
+            response = self.client.get(f'/baz/deleted{suffix}',
+                                       follow_redirects=True)
             self.assertEqual(response.status_code,
                              status.HTTP_404_NOT_FOUND)
             self.assertIn(b'Not here', response.data)
 
-            response = client.get('/baz/redirectme.html',
-                                  follow_redirects=False)
-            self.assertEqual(response.status_code,
-                             status.HTTP_302_FOUND)
-            self.assertEqual(response.headers['Location'],
-                             'http://localhost/baz/redirectme')
-
-    @mock.patch(f'{factory.__name__}.config', CONFIG)
-    def test_serve_with_htm(self):
-        """Legacy URLs that end in .htm should be handled gracefully."""
-        app = factory.create_web_app()
-        client = app.test_client()
-
-        with app.app_context():
-            response = client.get('/index.htm', follow_redirects=True)
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertIn(b'<title>This is the index', response.data)
-            self.assertIn(b'<h1 id="this-is-the-index">This is the index</h1>',
-                          response.data)
-            self.assertIn(b'<p>Here is <a href="foo">link</a>.</p>',
-                          response.data)
-
-            response = client.get('/foo.htm', follow_redirects=True)
+            response = self.client.get(f'/baz/redirectme{suffix}',
+                                       follow_redirects=True)
             self.assertEqual(response.status_code, status.HTTP_200_OK)
             self.assertIn(b'<title>Another foo page', response.data)
-            self.assertIn(b'<h1 id="another-foo-page">Another foo page</h1>',
-                          response.data)
-            self.assertIn(b'<p>See also <a href="baz">baz</a>.</p>',
-                          response.data)
 
-            response = client.get('/baz.htm', follow_redirects=True)
-            self.assertEqual(response.status_code, status.HTTP_200_OK)
-            self.assertIn(b'<title>Baz Page', response.data)
-            self.assertIn(
-                b'<h1 id="the-baz-index-page">The baz index page</h1>',
-                response.data
-            )
-
-            response = client.get('/nope.htm', follow_redirects=True)
+            response = self.client.head(f'/nope{suffix}',
+                                        follow_redirects=False)
             self.assertEqual(response.status_code,
                              status.HTTP_404_NOT_FOUND)
 
-            response = client.get('/baz/deleted.htm',
-                                  follow_redirects=True)
-            self.assertEqual(response.status_code,
-                             status.HTTP_404_NOT_FOUND)
-            self.assertIn(b'Not here', response.data)
 
-            response = client.get('/baz/redirectme.htm',
-                                  follow_redirects=False)
-            self.assertEqual(response.status_code,
-                             status.HTTP_302_FOUND)
-            self.assertEqual(response.headers['Location'],
-                             'http://localhost/baz/redirectme')
+class TestServeSiteWithCDN(ServeSiteMixin, TestCase):
+    """Serve the build site, with static files on a CDN."""
 
-    @mock.patch(f'{factory.__name__}.config', CONFIG)
-    def test_serve_static(self):
-        """Requests for static URLs should be redirected."""
-        app = factory.create_web_app()
-        client = app.test_client()
-
-        with app.app_context():
-            response = client.get('/notapage.txt', follow_redirects=False)
-            self.assertEqual(response.status_code, status.HTTP_302_FOUND)
-            self.assertEqual(
-                response.headers['Location'],
-                "https://%s.s3.amazonaws.com/static/arxiv.marxdown/%s/%s/%s"
-                % (S3_BUCKET, VERSION, SITE_NAME, "notapage.txt")
-            )
-
-    @mock.patch(f'{factory.__name__}.config', CONFIG_WITH_CDN)
-    def test_serve_cdn_static(self):
-        """Requests for static URLs should be redirected."""
-        app = factory.create_web_app()
-        client = app.test_client()
-
-        with app.app_context():
-            response = client.get('/notapage.txt', follow_redirects=False)
-            self.assertEqual(response.status_code, status.HTTP_302_FOUND)
-            self.assertEqual(
-                response.headers['Location'],
-                "https://%s/static/arxiv.marxdown/%s/%s/%s"
-                % (CDN, VERSION, SITE_NAME, "notapage.txt")
-            )
+    CONFIG = CONFIG_WITH_CDN
+    STATIC_HOST = CDN
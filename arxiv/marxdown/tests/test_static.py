@@ -11,7 +11,7 @@ SITE_NAME = 'test'
 APP_VERSION = '0.1'
 APP_NAME = 'arxiv.marxdown'
 BUCKET = 'test-bucket'
-CONFIG = mock.MagicMock(**{
+CONFIG_VALUES = {
     'BUILD_PATH': BUILD_DIR,
     'SITE_NAME': SITE_NAME,
     'SITE_HUMAN_NAME': 'The test site of testiness',
@@ -20,47 +20,31 @@ CONFIG = mock.MagicMock(**{
     'FLASKS3_BUCKET_NAME': BUCKET,
     'FLASKS3_ACTIVE': 1,
     'APP_VERSION': APP_VERSION
-})
+}
+CONFIG = mock.MagicMock(**CONFIG_VALUES)
 
 
 class TestRelativeStaticPaths(TestCase):
     """Test relative static paths feature."""
 
-    @mock.patch(f'{factory.__name__}.config',
-                mock.MagicMock(**{
-                    'BUILD_PATH': BUILD_DIR,
-                    'SITE_NAME': SITE_NAME,
-                    'SITE_HUMAN_NAME': 'The test site of testiness',
-                    'SITE_HUMAN_SHORT_NAME': 'Test site',
-                    'SITE_SEARCH_ENABLED': 1,
-                    'FLASKS3_BUCKET_NAME': BUCKET,
-                    'FLASKS3_ACTIVE': 1,
-                    'APP_VERSION': APP_VERSION,
-                    'RELATIVE_STATIC_PATHS': True,
-                    'SITE_URL_PREFIX': '/test'
-                }))
+    @staticmethod
+    def create_app(relative: bool):
+        """Create the app, with or without relative static paths."""
+        config = mock.MagicMock(**CONFIG_VALUES,
+                                RELATIVE_STATIC_PATHS=relative,
+                                SITE_URL_PREFIX='/test')
+        with mock.patch(f'{factory.__name__}.config', config):
+            return factory.create_web_app()
+
     def test_use_relative(self):
         """Relative static paths feature is enabled."""
-        app = factory.create_web_app()
+        app = self.create_app(relative=True)
         self.assertTrue(app.blueprints['docs'].url_prefix.startswith('/test'),
                         'The blueprint is mounted below the site URL prefix.')
 
-    @mock.patch(f'{factory.__name__}.config',
-                mock.MagicMock(**{
-                    'BUILD_PATH': BUILD_DIR,
-                    'SITE_NAME': SITE_NAME,
-                    'SITE_HUMAN_NAME': 'The test site of testiness',
-                    'SITE_HUMAN_SHORT_NAME': 'Test site',
-                    'SITE_SEARCH_ENABLED': 1,
-                    'FLASKS3_BUCKET_NAME': BUCKET,
-                    'FLASKS3_ACTIVE': 1,
-                    'APP_VERSION': APP_VERSION,
-                    'RELATIVE_STATIC_PATHS': False,
-                    'SITE_URL_PREFIX': '/test'
-                }))
     def test_dont_use_relative(self):
         """Relative static paths feature is enabled."""
-        app = factory.create_web_app()
+        app = self.create_app(relative=False)
         self.assertTrue(
             app.blueprints['docs'].url_prefix.startswith('/_marxdown'),
             'The blueprint is mounted at the root path.'
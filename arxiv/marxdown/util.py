@@ -0,0 +1,37 @@
+"""Helpers shared by the build and the services."""
+
+import os
+from typing import Iterable, Tuple
+
+
+def walk_files(path: str) -> Iterable[Tuple[str, os.DirEntry]]:
+    """
+    (Lazily) walk the files under ``path``.
+
+    Visits files in the same order as a top-down :func:`os.walk`, but yields
+    the :class:`os.DirEntry` for each file, so callers can use the type
+    information that :func:`os.scandir` gets for free rather than stat-ing
+    each one. As with :func:`os.walk`, links to directories aren't followed
+    and directories that can't be read (including ``path`` itself) are
+    skipped.
+
+    Returns
+    -------
+    generator
+        Yields the containing directory and the entry for each file.
+
+    """
+    stack = [path]
+    while stack:
+        parent = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(parent) as entries:
+                for entry in entries:
+                    if not entry.is_dir():
+                        yield parent, entry
+                    elif not entry.is_symlink():
+                        subdirs.append(entry.path)
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
@@ -65,72 +65,184 @@ To build the sitemap:
 output file that is used by the :mod:`sitemap` application to serve the
 sitemap.
 
+Pass ``-c /path/to/cache`` (or set ``MARXDOWN_CLONE_CACHE``) to keep the
+site repositories between builds. Repositories that are already in the cache
+are updated with ``git fetch`` rather than cloned again, and sites whose
+source and spec haven't changed since the last build aren't built again.
+
 """
 
+import fcntl
 import json
 import re
+import shutil
 import tempfile
 import sys
 import subprocess
 import os
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from typing import Iterator, List, Optional, Tuple
 
+import pkg_resources
 from mypy_extensions import TypedDict
 from flask import Flask
 
 from arxiv.base.globals import get_application_config
 from arxiv.base import logging
-from arxiv.util.serialize import ISO8601JSONEncoder
+from arxiv.util.serialize import ISO8601JSONEncoder, ISO8601JSONDecoder
 
 from arxiv.marxdown.factory import create_web_app
 from arxiv.marxdown.services import site
 from arxiv.marxdown import build
-from arxiv.marxdown.domain import SiteTree, SiteTreePart
+from arxiv.marxdown.domain import SiteTree
 
 import click
 
 logger = logging.getLogger(__name__)
 
+CLONE_WORKERS = 8
+"""Number of site repositories that are cloned at the same time."""
+
+SITE_NAME = re.compile(r'[a-zA-Z_]+')
+"""Site names are used as directory names, so we keep them simple."""
+
+REQUIRED_KEYS = ('repo', 'source_dir', 'source_ref', 'human_name',
+                 'url_prefix')
+"""Keys that every :class:`.SiteSpec` must have, other than ``name``."""
+
+SUBTREE_CACHE = 'map.cache.json'
+"""Name of the file in the cache directory in which site trees are kept."""
+
+CACHE_VERSION = 1
+"""
+Version of the cached site trees.
+
+Bump this when a change to marXdown changes the site trees that it builds,
+so that cached trees built by the old code aren't reused. Upgrading the
+installed marXdown package has the same effect.
+"""
+
 
 @click.command()
 @click.option('--spec-file', '-s', help="Path to the site spec file (json).")
 @click.option('--out-file', '-o', help="Path to the write the sitemap (json)")
-def create_site_map(spec_file: str, out_file: str) -> None:
+@click.option('--cache-dir', '-c', default=None,
+              envvar='MARXDOWN_CLONE_CACHE',
+              help="Directory in which to keep site repositories between"
+                   " builds (or set MARXDOWN_CLONE_CACHE). By default, a"
+                   " temporary directory is used.")
+@click.option('--pretty/--no-pretty', '-p', default=False,
+              help="Indent the sitemap (json), to make it easier to read.")
+def create_site_map(spec_file: str, out_file: str,
+                    cache_dir: Optional[str] = None,
+                    pretty: bool = False) -> None:
     """Create a site map from a site spec (JSON)."""
-    do_create_site_map(spec_file, out_file)
+    do_create_site_map(spec_file, out_file, cache_dir, pretty)
 
 
-def do_create_site_map(spec_file: str, out_file: str) -> None:
+def do_create_site_map(spec_file: str, out_file: str,
+                       cache_dir: Optional[str] = None,
+                       pretty: bool = False) -> None:
     """Create a site map from a site spec (JSON)."""
     with open(spec_file) as f:
         specs = json.load(f)
 
-    tree = {}
-    working_path = tempfile.mkdtemp()   # Create a temporary working directory.
+    site_trees: List[SiteTree] = []
+    if cache_dir is None:
+        working_path = tempfile.mkdtemp()   # Create a temporary working dir.
+    else:
+        working_path = cache_dir
+        os.makedirs(working_path, exist_ok=True)
 
     # Validate ahead of time so we don't do costly things.
     for spec in specs['sites']:
         _validate_spec(spec)
 
+    # Retrieve source for all of the sites up front. Cloning is mostly
+    # waiting on the network, so we do it in threads. Sites are often in
+    # different directories of the same repo, so each repo (and ref) is only
+    # cloned once; the clone is named for the first site that uses it.
+    to_clone = {}
+    for spec in specs['sites']:
+        to_clone.setdefault(_get_source_key(spec), spec)
+    with ThreadPoolExecutor(max_workers=CLONE_WORKERS) as executor:
+        repo_paths = dict(zip(
+            to_clone,
+            executor.map(partial(_retrieve_repository, working_path),
+                         to_clone.values())
+        ))
+
+    # A site only needs to be built again if its source or its spec has
+    # changed since it was last built with this cache directory.
+    # Only the sites in the current spec are written back to the cache, so
+    # sites that have been removed from it don't linger there.
+    subtree_cache_path = os.path.join(working_path, SUBTREE_CACHE)
+    cached_subtrees = _load_subtrees(subtree_cache_path) if cache_dir else {}
+    subtrees = {}
+    builder = _get_builder_version()
+
+    # Sites are built one at a time. Building is CPU-bound, and the marXdown
+    # services keep module-level state for the site that is being built.
     for spec in specs['sites']:
-        # Retrieve source for site.
-        repo_path = _retrieve_repository(working_path, spec)
+        repo_path = repo_paths[_get_source_key(spec)]
+        fingerprint = None
+        if cache_dir is not None:
+            fingerprint = {
+                'sha': _run_git(spec, repo_path, 'rev-parse', 'HEAD',
+                                output=True).strip(),
+                'spec': spec,
+                'builder': builder
+            }
+            cached = cached_subtrees.get(spec['name'])
+            if cached is not None and cached['fingerprint'] == fingerprint:
+                logger.debug('%s has not changed since the last build',
+                             spec['name'])
+                site_trees.append(cached['subtree'])
+                subtrees[spec['name']] = cached
+                continue
 
-        # Build the site.
         app = create_web_app(extra_config=_get_site_config(repo_path, spec))
         with app.app_context():
             build._build_site(False)
             subtree = site.get_tree()
             if "server" in spec:
-                subtree = {
-                    f"{spec['server']}{key}":
-                        _paths_to_urls(spec["server"], part)
-                    for key, part in subtree.items()
-                }
-            tree.update(subtree)
+                _paths_to_urls(spec["server"], subtree)
+        site_trees.append(subtree)
+        subtrees[spec['name']] = {'fingerprint': fingerprint,
+                                  'subtree': subtree}
+
+    if cache_dir is not None:
+        with open(subtree_cache_path, 'w') as f:
+            f.write(_to_json(subtrees))
 
     # Write the tree to a JSON document. This is used to serve the sitemap.
+    # Merging changes the site trees, so this happens after they are cached.
     with open(out_file, 'w') as f:
-        json.dump(tree, f, indent=2, cls=ISO8601JSONEncoder)
+        f.write(_to_json(_merge_trees(site_trees), pretty))
+
+
+def _get_builder_version() -> str:
+    """Identify the code that builds the site trees, for the subtree cache."""
+    try:
+        version = pkg_resources.get_distribution('arxiv-marxdown').version
+    except pkg_resources.DistributionNotFound:
+        version = 'unknown'
+    return f'{version}/{CACHE_VERSION}'
+
+
+def _to_json(data: dict, pretty: bool = False) -> str:
+    """
+    Serialize ``data`` as compactly (or as readably) as possible.
+
+    Unlike :func:`json.dump`, :func:`json.dumps` can use the C encoder, but
+    only if the output isn't indented.
+    """
+    if pretty:
+        return json.dumps(data, indent=2, cls=ISO8601JSONEncoder)
+    return json.dumps(data, separators=(',', ':'), cls=ISO8601JSONEncoder)
 
 
 SiteSpec = TypedDict(
@@ -151,45 +263,115 @@ def _validate_spec(spec: SiteSpec) -> None:
     """Check a :class:`.SiteSpec` for common problems."""
     if 'name' not in spec:
         raise ValueError('missing name')
-    if re.search(r'[^a-zA-Z_]+', spec['name']):
+    if not SITE_NAME.fullmatch(spec['name']):
         raise ValueError(f'{spec["name"]}: name must contain only [a-ZA-Z_]')
-    if 'repo' not in spec:
-        raise ValueError(f'{spec["name"]}: missing repo')
+    missing = [key for key in REQUIRED_KEYS if key not in spec]
+    if missing:
+        raise ValueError(f'{spec["name"]}: missing {", ".join(missing)}')
     if ':' not in spec['repo'] \
             or '.git' not in spec['repo'] \
             or 'git@' not in spec['repo']:
         raise ValueError(f'{spec["name"]}: that does not look like a git repo')
-    if 'source_dir' not in spec:
-        raise ValueError(f'{spec["name"]}: missing source_dir')
-    if 'source_ref' not in spec:
-        raise ValueError(f'{spec["name"]}: source_ref must be a tag or branch')
-    if 'human_name' not in spec:
-        raise ValueError(f'{spec["name"]}: missing human_name')
-    if 'url_prefix' not in spec:
-        raise ValueError(f'{spec["name"]}: missing url_prefix')
     if 'server' in spec and '://' not in spec['server']:
         raise ValueError(f'{spec["name"]}: server should have protocol')
 
 
+def _get_source_key(spec: SiteSpec) -> Tuple[str, str]:
+    """Sites with the same key can be built from the same clone."""
+    return spec['repo'], spec['source_ref']
+
+
 def _retrieve_repository(working_path: str, spec: SiteSpec):
-    """Clone a git repo if it doesn't already exist under ``working_path``."""
+    """
+    Get an up-to-date copy of a git repo under ``working_path``.
+
+    If the repo was already cloned (e.g. by a previous build using the same
+    cache directory), it is updated to the latest ``source_ref``. Otherwise
+    it is cloned.
+    """
     repo_path = os.path.join(working_path, spec['name'])
-    if not os.path.exists(repo_path):
-        r = subprocess.run(
-            f"git clone --branch {spec['source_ref']}"
-            f" {spec['repo']} {repo_path}",
-            cwd=working_path,
-            shell=True,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        if r.returncode != 0:
-            raise RuntimeError(
-                f"Failed to clone {spec['repo']}: {r.stdout} // {r.stderr}"
-            )
+    # Another build using the same cache directory could be at work on this
+    # repo at the same time.
+    with _lock(f'{repo_path}.lock'):
+        if os.path.exists(os.path.join(repo_path, '.git')):
+            _run_git(spec, repo_path, 'remote', 'set-url', 'origin',
+                     spec['repo'])
+            _run_git(spec, repo_path, 'fetch', '--tags', 'origin',
+                     spec['source_ref'])
+            _run_git(spec, repo_path, 'reset', '--hard', 'FETCH_HEAD')
+            _run_git(spec, repo_path, 'clean', '-fdx')
+        else:
+            # Probably left over from a clone that didn't finish.
+            if os.path.exists(repo_path):
+                shutil.rmtree(repo_path)
+            # The build needs the full commit history (for page modification
+            # dates and revision histories) and the tags (for the site
+            # version), but only needs file contents at ``source_ref``. So we
+            # leave out the other branches, and the blobs that aren't checked
+            # out. A server that doesn't support the filter sends everything.
+            # Rename detection in ``git log`` would fetch the missing blobs
+            # one at a time, which is why the marXdown commit index runs it
+            # with ``--no-renames``; keep the two in step.
+            _run_git(spec, working_path, 'clone', '--single-branch',
+                     '--filter=blob:none', '--branch', spec['source_ref'],
+                     spec['repo'], repo_path)
     return repo_path
 
 
+def _run_git(spec: SiteSpec, cwd: str, *args: str,
+             output: bool = False) -> str:
+    """
+    Run a git command for the repo in ``spec``.
+
+    Git's output is thrown away unless we ask for it with ``output``, in
+    which case it is returned. Errors are always kept, so that we can say
+    what went wrong.
+    """
+    r = subprocess.run(
+        ['git', *args],
+        cwd=cwd,
+        stdout=subprocess.PIPE if output else subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        # Fail rather than wait for credentials that will never come.
+        env=dict(os.environ, GIT_TERMINAL_PROMPT='0'),
+    )
+    if r.returncode != 0:
+        raise RuntimeError(
+            f"Failed to {args[0]} {spec['repo']}:"
+            f" {r.stderr.decode('utf-8', 'replace')}"
+        )
+    return r.stdout.decode('utf-8') if output else ''
+
+
+def _load_subtrees(subtree_cache_path: str) -> dict:
+    """
+    Load the site trees kept from previous builds.
+
+    If they can't be read for any reason, every site is just built again.
+    """
+    try:
+        with open(subtree_cache_path) as f:
+            subtrees: dict = json.load(f, cls=ISO8601JSONDecoder)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        logger.warning('Could not load site trees from %s: %s',
+                       subtree_cache_path, e)
+        return {}
+    return subtrees
+
+
+@contextmanager
+def _lock(lock_path: str) -> Iterator[None]:
+    """Hold an exclusive (advisory) lock on ``lock_path``."""
+    with open(lock_path, 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
 def _get_site_config(repo_path: str, spec: SiteSpec) -> dict:
     """Configure marXdown from the site spec."""
     source_path = os.path.join(repo_path, spec['source_dir'])
@@ -207,15 +389,51 @@ def _get_site_config(repo_path: str, spec: SiteSpec) -> dict:
     return config
 
 
-def _paths_to_urls(server: str, tree_part: SiteTreePart) -> SiteTreePart:
-    """Reformat paths in a :const:`SiteTreePart` using a ``server`` URL."""
-    tree_part["path"] = f"{server}{tree_part['path']}"
-    if "children" in tree_part:
-        tree_part["children"] = {
-            f"{server}{key}": _paths_to_urls(server, child)
-            for key, child in tree_part["children"].items()
-        }
-    return tree_part
+def _merge_trees(trees: List[SiteTree]) -> SiteTree:
+    """
+    Merge the trees for several sites into one :const:`SiteTree`.
+
+    Sites can share a node (e.g. a common parent path), in which case their
+    children are merged rather than one replacing the other. Where both have
+    a title or other field, the later site wins. Only the shared nodes are
+    descended into, and the trees are merged in place.
+    """
+    merged: SiteTree = {}
+    for tree in trees:
+        stack = [(merged, tree)]
+        while stack:
+            into, nodes = stack.pop()
+            for key, node in nodes.items():
+                existing = into.get(key)
+                if existing is None:
+                    into[key] = node
+                    continue
+                for field, value in node.items():
+                    if field != 'children':
+                        existing[field] = value
+                if node.get('children'):
+                    stack.append((existing.setdefault('children', {}),
+                                  node['children']))
+    return merged
+
+
+def _paths_to_urls(server: str, tree: SiteTree) -> SiteTree:
+    """
+    Reformat paths in a :const:`SiteTree` using a ``server`` URL.
+
+    The tree is updated in place, one level at a time, rather than rebuilt.
+    """
+    stack = [tree]
+    while stack:
+        nodes = stack.pop()
+        # Re-inserting each node after popping it keeps the original order.
+        for key in list(nodes):
+            node = nodes.pop(key)
+            node["path"] = f"{server}{node['path']}"
+            if "children" in node:
+                stack.append(node["children"])
+            nodes[f"{server}{key}"] = node
+    return tree
 
 
 if __name__ == '__main__':
@@ -20,33 +20,41 @@ This module relies on a sitemap JSON document, that looks like this:
 """
 
 
-from typing import Any
+from typing import List
+from functools import lru_cache
 import json
+import os
 
 from arxiv.util.serialize import ISO8601JSONDecoder
 from arxiv.base.globals import get_application_config
 from .domain import URLSet
 
 
-class URLDecoder(ISO8601JSONDecoder):
-    """JSON Decoder that rewrites paths as full URLs."""
-
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        """Pass :func:`object_hook` to the base constructor."""
-        self._url_root = kwargs.pop('url_root', '').rstrip('/')
-        kwargs['object_hook'] = kwargs.get('object_hook', self.object_hook)
-        super(URLDecoder, self).__init__(*args, **kwargs)
+def load_urlset(url_root: str, urlset_path: str) -> URLSet:
+    """
+    Load a :const:`URLSet` from a JSON document.
 
-    def object_hook(self, data: dict, **extra: Any) -> Any:
-        """Intercept and update paths to full URLs."""
-        for key, value in data.items():
-            if key == "path" and "://" not in value:
-                data[key] = f"{self._url_root}{value}"
-        return super(URLDecoder, self).object_hook(data, **extra)
+    The document only changes when the sitemap is rebuilt, so we hang on to
+    what we loaded until the file is modified. The returned :const:`URLSet`
+    is shared, and must not be changed.
+    """
+    stat = os.stat(urlset_path)
+    return _load_urlset(url_root, urlset_path, stat.st_mtime_ns, stat.st_size)
 
 
-def load_urlset(url_root: str, urlset_path: str) -> URLSet:
-    """Load a :const:`URLSet` from a JSON document."""
+@lru_cache(maxsize=8)
+def _load_urlset(url_root: str, urlset_path: str, mtime_ns: int,
+                 size: int) -> URLSet:
     with open(urlset_path) as f:
-        data: URLSet = json.load(f, cls=URLDecoder, url_root=url_root)
+        data: URLSet = json.load(f, cls=ISO8601JSONDecoder)
+
+    # Rewrite paths as full URLs, one level of the tree at a time.
+    url_root = url_root.rstrip('/')
+    stack: List[URLSet] = [data]
+    while stack:
+        for url in stack.pop().values():
+            if "://" not in url["path"]:
+                url["path"] = f"{url_root}{url['path']}"
+            if url.get("children"):
+                stack.append(url["children"])
     return data
@@ -1,8 +1,10 @@
 """Provides the main routes for the application."""
 
-from typing import Dict, Callable
+from typing import Dict, Callable, Iterable, Any
 
-from flask import Blueprint, request, render_template, Response, current_app
+from flask import Blueprint, request, Response, current_app, \
+    stream_with_context
+from flask.signals import before_render_template, template_rendered
 import jinja2
 from werkzeug.exceptions import NotFound
 
@@ -21,15 +23,42 @@ def get_xml_sitemap() -> Response:
     """Get a machine-readable XML sitemap."""
     urlset_path = current_app.config['URLSET_PATH']
     urlset = load.load_urlset(request.url_root, urlset_path)
-    return Response(serialize.sitemap_xml(urlset),
+    return Response(serialize.iter_sitemap_xml(urlset),
                     content_type="application/xml")
 
 
 @blueprint.route('/sitemap.html', methods=['GET'])
 def get_html_sitemap() -> Response:
-    """Get a human-readable HTML sitemap."""
+    """
+    Get a human-readable HTML sitemap.
+
+    The sitemap can be large, so the page is sent as it is rendered rather
+    than all at once.
+    """
     urlset_path = current_app.config['URLSET_PATH']
-    return render_template(
-        "sitemap/sitemap.html",
-        urlset=load.load_urlset(request.url_root, urlset_path)
+    urlset = load.load_urlset(request.url_root, urlset_path)
+    return Response(
+        stream_with_context(_stream_template("sitemap/sitemap.html",
+                                             urlset=urlset)),
+        content_type="text/html; charset=utf-8"
     )
+
+
+def _stream_template(template_name: str, **context: Any) -> Iterable[str]:
+    """
+    Render a template in chunks.
+
+    This is equivalent to :func:`flask.render_template`, except that the
+    rendered content is yielded as it goes.
+    """
+    app = current_app._get_current_object()
+    app.update_template_context(context)
+    # Get the template now, so that a missing template is an error here
+    # rather than part-way through the response.
+    template = app.jinja_env.get_or_select_template(template_name)
+
+    def generate() -> Iterable[str]:
+        before_render_template.send(app, template=template, context=context)
+        yield from template.generate(context)
+        template_rendered.send(app, template=template, context=context)
+    return generate()
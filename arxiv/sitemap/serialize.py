@@ -19,41 +19,82 @@ Here's a simple example from the spec:
 See `https://www.sitemaps.org/protocol.html`_. For details.
 """
 
-from typing import Iterable
-# from lxml import etree    # Issues with lxml version in mod_wsgi. :-(
-import io
-from xml.etree import ElementTree as etree
+from datetime import datetime, tzinfo
+from functools import lru_cache
+from typing import Iterable, Optional
+from xml.sax import saxutils
 
 from .domain import URLSet, URL
 
 SITEMAPS_NAMESPACE = "http://www.sitemaps.org/schemas/sitemap/0.9"
 
 
-def sitemap_xml(urlset: URLSet) -> str:
+def sitemap_xml(urlset: URLSet) -> bytes:
     """Generate a sitemap XML document."""
-    root = etree.Element("urlset", xmlns=SITEMAPS_NAMESPACE)
+    return b"".join(iter_sitemap_xml(urlset))
+
+
+def iter_sitemap_xml(urlset: URLSet) -> Iterable[bytes]:
+    """
+    (Lazily) generate a sitemap XML document.
+
+    Each ``<url>`` is written out as soon as it is generated, so the document
+    can be streamed without holding all of it in memory. The structure of
+    the document is fixed and very simple, so we write it by hand rather
+    than building elements to serialize. The output is byte-for-byte what
+    :mod:`xml.etree.ElementTree` would produce (see :func:`_element`).
+    """
+    yield b"<?xml version='1.0' encoding='UTF-8'?>\n"
+    yield f'<urlset xmlns="{SITEMAPS_NAMESPACE}">'.encode("utf-8")
     for url in iter_urls(urlset):
-        root.append(url_xml(url))
-    buffer = io.BytesIO()
-    tree = etree.ElementTree(root)
-    tree.write(buffer, encoding="UTF-8", xml_declaration=True)
-    buffer.seek(0)
-    return buffer.read()
-    # return root.read()
-    # If we ever get to use lxml....
-    # xml_declaration=True
-    # pretty_print=True
+        yield url_xml(url).encode("utf-8")
+    yield b"</urlset>"
+
+
+def escape(text: str) -> str:
+    """
+    Escape ``text`` for use in an XML element.
+
+    Almost nothing in a sitemap needs escaping, and checking for the
+    characters that do is much quicker than trying to replace them.
+    """
+    if '&' in text or '<' in text or '>' in text:
+        return saxutils.escape(text)
+    return text
+
+
+def _element(tag: str, text: str) -> str:
+    """
+    Write an element with only ``text`` in it.
+
+    Like :mod:`xml.etree.ElementTree`, an element with no text is written
+    as a self-closing tag.
+    """
+    if not text:
+        return f"<{tag} />"
+    return f"<{tag}>{escape(text)}</{tag}>"
 
 
 def iter_urls(urlset: URLSet) -> Iterable[URL]:
-    """Pull all of the :class:`.URL`s from an :class:`.URLSet`."""
-    for _, url in urlset.items():
+    """
+    Pull all of the :class:`.URL`s from an :class:`.URLSet`.
+
+    Each URL comes before its children, as in the sitemap itself. We walk
+    the tree with a stack of iterators, rather than recursing, so that each
+    URL is yielded once instead of being passed up a chain of generators.
+    """
+    stack = [iter(urlset.values())]
+    while stack:
+        url = next(stack[-1], None)
+        if url is None:
+            stack.pop()
+            continue
         yield url
-        for child_url in iter_urls(url["children"]):
-            yield child_url
+        if url["children"]:
+            stack.append(iter(url["children"].values()))
 
 
-def lastmod(url: URL) -> etree.Element:
+def lastmod(url: URL) -> str:
     """
     Date of last modification of the file.
 
@@ -64,12 +105,24 @@ def lastmod(url: URL) -> etree.Element:
     server can return, and search engines may use the information from both
     sources differently.
     """
-    element = etree.Element("lastmod")
-    element.text = url["modified"].isoformat()
-    return element
+    modified = url["modified"]
+    return _element("lastmod", _isoformat(modified, modified.tzinfo))
+
+
+@lru_cache(maxsize=4096)
+def _isoformat(dt: datetime, tz: Optional[tzinfo]) -> str:
+    """
+    Format a datetime, remembering the result.
+
+    Pages that were changed together have the same modification time, so
+    we see the same few datetimes over and over. Datetimes in different
+    timezones can be equal without being formatted the same, which is why
+    ``tz`` is part of the key.
+    """
+    return dt.isoformat()
 
 
-def loc(url: URL) -> etree.Element:
+def loc(url: URL) -> str:
     """
     URL of the page.
 
@@ -77,12 +130,10 @@ def loc(url: URL) -> etree.Element:
     trailing slash, if your web server requires it. This value must be less
     than 2,048 characters.
     """
-    element = etree.Element("loc")
-    element.text = url["path"]
-    return element
+    return _element("loc", url["path"])
 
 
-def changefreq(url: URL) -> etree.Element:
+def changefreq(url: URL) -> str:
     """
     How frequently the page is likely to change.
 
@@ -108,18 +159,14 @@ def changefreq(url: URL) -> etree.Element:
     that. Crawlers may periodically crawl pages marked "never" so that they can
     handle unexpected changes to those pages.
     """
-    element = etree.Element("changefreq")
-    element.text = url.get("changefreq", "monthly")
-    return element
+    frequency = url.get("changefreq", "monthly")
+    return _element("changefreq", frequency)
 
 
-def url_xml(url: URL) -> etree.Element:
-    """Generate an :class:`etree.Element` for a single URL."""
-    url_element = etree.Element("url")
-    url_element.append(loc(url))
+def url_xml(url: URL) -> str:
+    """Generate the ``<url>`` element for a single URL."""
     try:
-        url_element.append(lastmod(url))
+        modified = lastmod(url)
     except KeyError:    # No modified date.
-        pass
-    url_element.append(changefreq(url))
-    return url_element
+        modified = ""
+    return f"<url>{loc(url)}{modified}{changefreq(url)}</url>"
@@ -5,6 +5,7 @@ import os
 import shutil
 import tempfile
 import json
+import copy
 from .. import build
 
 
@@ -161,8 +162,132 @@ class TestBuildMap(TestCase):
             stdout=b'',
             stderr=b'',
         )
-        mock_site.get_tree.side_effect = self.TREES
+        mock_site.get_tree.side_effect = copy.deepcopy(self.TREES)
 
         build.do_create_site_map(self.spec_file, self.out_file)
         with open(self.out_file) as f:
             self.assertDictEqual(json.load(f), self.EXPECTED)
+        self.assertEqual(mock_subprocess.run.call_count, 1,
+                         'Sites in the same repo share a single clone')
+
+    @mock.patch(f'{build.__name__}.site')
+    @mock.patch(f'{build.__name__}.build')
+    @mock.patch(f'{build.__name__}.subprocess')
+    def test_build_with_cache(self, mock_subprocess, mock_build, mock_site):
+        """Repos that are already in the cache are updated, not cloned."""
+        mock_subprocess.run.return_value = mock.MagicMock(
+            returncode=0,
+            stdout=b'',
+            stderr=b'',
+        )
+        mock_site.get_tree.side_effect = copy.deepcopy(self.TREES)
+        cache_dir = os.path.join(self.out_dir, 'cache')
+        os.makedirs(os.path.join(cache_dir, 'help', '.git'))
+
+        build.do_create_site_map(self.spec_file, self.out_file, cache_dir)
+        commands = {(args[0][1], args[0][-1])
+                    for args, _ in mock_subprocess.run.call_args_list}
+        self.assertIn(('fetch', 'develop'), commands)
+        self.assertFalse([cmd for cmd in commands if cmd[0] == 'clone'],
+                         'All of the sites are built from the cached repo')
+        with open(self.out_file) as f:
+            self.assertDictEqual(json.load(f), self.EXPECTED)
+
+
+    @mock.patch(f'{build.__name__}.site')
+    @mock.patch(f'{build.__name__}.build')
+    @mock.patch(f'{build.__name__}.subprocess')
+    def test_rebuild_unchanged(self, mock_subprocess, mock_build, mock_site):
+        """Sites that haven't changed since the last build aren't rebuilt."""
+        mock_subprocess.run.return_value = mock.MagicMock(
+            returncode=0,
+            stdout=b'abc123\n',
+            stderr=b'',
+        )
+        # Only enough trees for one build of each site.
+        mock_site.get_tree.side_effect = copy.deepcopy(self.TREES)
+        cache_dir = os.path.join(self.out_dir, 'cache')
+
+        build.do_create_site_map(self.spec_file, self.out_file, cache_dir)
+        self.assertEqual(mock_build._build_site.call_count, 3)
+
+        build.do_create_site_map(self.spec_file, self.out_file, cache_dir)
+        self.assertEqual(mock_build._build_site.call_count, 3)
+        with open(self.out_file) as f:
+            self.assertDictEqual(json.load(f), self.EXPECTED)
+
+        mock_subprocess.run.return_value.stdout = b'def456\n'
+        mock_site.get_tree.side_effect = copy.deepcopy(self.TREES)
+        build.do_create_site_map(self.spec_file, self.out_file, cache_dir)
+        self.assertEqual(mock_build._build_site.call_count, 6,
+                         'Sites are rebuilt when their source changes')
+
+        mock_site.get_tree.side_effect = copy.deepcopy(self.TREES)
+        next_version = build.CACHE_VERSION + 1
+        with mock.patch.object(build, 'CACHE_VERSION', next_version):
+            build.do_create_site_map(self.spec_file, self.out_file, cache_dir)
+        self.assertEqual(mock_build._build_site.call_count, 9,
+                         'Sites are rebuilt when the builder changes')
+
+    @mock.patch(f'{build.__name__}.site')
+    @mock.patch(f'{build.__name__}.build')
+    @mock.patch(f'{build.__name__}.subprocess')
+    def test_cache_removed_site(self, mock_subprocess, mock_build, mock_site):
+        """Sites that are no longer in the spec are dropped from the cache."""
+        mock_subprocess.run.return_value = mock.MagicMock(
+            returncode=0,
+            stdout=b'abc123\n',
+            stderr=b'',
+        )
+        mock_site.get_tree.side_effect = copy.deepcopy(self.TREES)
+        cache_dir = os.path.join(self.out_dir, 'cache')
+        build.do_create_site_map(self.spec_file, self.out_file, cache_dir)
+
+        with open(self.spec_file, 'w') as f:
+            json.dump({'sites': self.SPEC['sites'][:2]}, f)
+        build.do_create_site_map(self.spec_file, self.out_file, cache_dir)
+        self.assertEqual(mock_build._build_site.call_count, 3)
+        with open(os.path.join(cache_dir, build.SUBTREE_CACHE)) as f:
+            self.assertEqual(set(json.load(f)), {'help', 'corr'})
+
+
+class TestValidateSpec(TestCase):
+    """Test checking site specs before anything is cloned."""
+
+    def test_valid(self):
+        """A complete spec passes."""
+        for spec in TestBuildMap.SPEC['sites']:
+            build._validate_spec(spec)
+
+    def test_missing_keys(self):
+        """All of the missing keys are reported at once."""
+        spec = dict(TestBuildMap.SPEC['sites'][0])
+        del spec['source_dir'], spec['url_prefix']
+        with self.assertRaisesRegex(ValueError,
+                                    'help: missing source_dir, url_prefix'):
+            build._validate_spec(spec)
+
+    def test_bad_name(self):
+        """Site names can only contain letters and underscores."""
+        spec = dict(TestBuildMap.SPEC['sites'][0], name='../help')
+        with self.assertRaisesRegex(ValueError, 'name must contain only'):
+            build._validate_spec(spec)
+
+
+class TestMergeTrees(TestCase):
+    """Test merging the trees for several sites."""
+
+    def test_shared_node(self):
+        """Sites that share a node both keep their children."""
+        first = {'/ng': {'title': 'One', 'path': '/ng', 'children': {
+            '/ng/help': {'title': 'Help', 'path': '/ng/help', 'children': {}}
+        }}}
+        second = {'/ng': {'title': 'Two', 'path': '/ng', 'children': {
+            '/ng/new': {'title': 'New', 'path': '/ng/new', 'children': {}}
+        }}}
+        merged = build._merge_trees([first, second])
+        self.assertEqual(list(merged), ['/ng'])
+        self.assertEqual(merged['/ng']['title'], 'Two',
+                         'The later site wins for other fields')
+        self.assertEqual(list(merged['/ng']['children']),
+                         ['/ng/help', '/ng/new'])
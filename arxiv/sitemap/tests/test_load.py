@@ -0,0 +1,41 @@
+"""Tests for :mod:`sitemap.load`."""
+
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+
+from .. import load
+
+DATA_PATH = os.path.join(os.path.split(os.path.abspath(__file__))[0], 'data')
+
+
+class TestLoadURLSet(TestCase):
+    """Tests for :func:`.load.load_urlset`."""
+
+    def setUp(self):
+        """Copy the sample sitemap, so that we can change it."""
+        self.tmp_dir = tempfile.mkdtemp()
+        self.urlset_path = os.path.join(self.tmp_dir, 'sitemap.json')
+        shutil.copy(os.path.join(DATA_PATH, 'sitemap.json'), self.urlset_path)
+
+    def tearDown(self):
+        """Clean up."""
+        shutil.rmtree(self.tmp_dir)
+
+    def test_load_unchanged(self):
+        """The sitemap isn't parsed again until it changes."""
+        urlset = load.load_urlset('http://foosite.com', self.urlset_path)
+        self.assertIs(load.load_urlset('http://foosite.com', self.urlset_path),
+                      urlset)
+        self.assertIsNot(
+            load.load_urlset('http://barsite.com', self.urlset_path),
+            urlset,
+            'Each URL root gets its own URLs'
+        )
+
+        with open(self.urlset_path, 'w') as f:
+            f.write('{}')
+        self.assertEqual(
+            load.load_urlset('http://foosite.com', self.urlset_path), {}
+        )
@@ -1,6 +1,7 @@
 """Tests for :mod:`sitemap.serialize`."""
 
 from unittest import TestCase, mock
+from datetime import datetime
 import os
 from xml.etree import ElementTree as etree
 import io
@@ -38,3 +39,29 @@ class TestSitemapXML(TestCase):
             return True     # If we make it this far...
 
         self.assertTrue(elements_equal(generated_urlset, expected_urlset))
+
+    def test_same_as_elementtree(self):
+        """The XML is the same as ElementTree writes, down to the bytes."""
+        modified = datetime(2019, 2, 11, 18, 41, 35)
+        urlset = {
+            '/': {'title': 'Home', 'path': 'http://foo.com/?a=1&b=<2>',
+                  'modified': modified, 'children': {
+                      '/empty': {'title': 'Empty', 'path': '',
+                                 'changefreq': '', 'children': {}}
+                  }},
+        }
+
+        root = etree.Element("urlset", xmlns=serialize.SITEMAPS_NAMESPACE)
+        for url in serialize.iter_urls(urlset):
+            element = etree.SubElement(root, "url")
+            etree.SubElement(element, "loc").text = url["path"]
+            if "modified" in url:
+                etree.SubElement(element, "lastmod").text = \
+                    url["modified"].isoformat()
+            etree.SubElement(element, "changefreq").text = \
+                url.get("changefreq", "monthly")
+        buffer = io.BytesIO()
+        etree.ElementTree(root).write(buffer, encoding="UTF-8",
+                                      xml_declaration=True)
+
+        self.assertEqual(serialize.sitemap_xml(urlset), buffer.getvalue())